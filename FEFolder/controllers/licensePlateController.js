@@ -104,8 +104,8 @@ const licensePlateController = {
                 message: 'Bắt đầu xử lý luồng video...'
             });
 
-            // Convert base64 to buffer
-            const imageBuffer = Buffer.from(req.body.image.split(',')[1], 'base64');
+            // Strip the data URL prefix if present; the worker decodes the base64 itself
+            const imageB64 = req.body.image.split(',').pop();
             
             wsService.sendDetectionProgress(req.user._id, {
                 stage: 'detecting',
@@ -114,7 +114,7 @@ const licensePlateController = {
             });
 
             // Process the image
-            const result = await detectionService.detectFromStream(imageBuffer);
+            const result = await detectionService.detectFromStream(imageB64);
             
             wsService.sendDetectionProgress(req.user._id, {
                 stage: 'detecting',
@@ -1,67 +1,176 @@
 const { spawn } = require('child_process');
 const path = require('path');
-const fs = require('fs').promises;
 
 class DetectionService {
     constructor() {
         this.pythonPath = 'python';  // Assuming python is in PATH
         this.scriptPath = path.join(__dirname, '../../License-Plate-Recognition/lp_image.py');
+        this.worker = null;
+        this.ready = null;
+        this.pending = new Map();
+        this.nextId = 1;
+        this.buffer = '';
+        this.requestTimeout = Number(process.env.DETECTION_TIMEOUT_MS) || 30000;
+        // Loading the models (and exporting them to ONNX) is slower than a request
+        this.startupTimeout = Number(process.env.DETECTION_STARTUP_TIMEOUT_MS) || 300000;
+        // Consecutive request timeouts after which the worker counts as wedged
+        this.maxTimeouts = Number(process.env.DETECTION_MAX_TIMEOUTS) || 3;
+        this.timeouts = 0;
     }
 
-    async detectPlate(imagePath) {
-        return new Promise((resolve, reject) => {
-            const process = spawn(this.pythonPath, [this.scriptPath, imagePath]);
-            let outputData = '';
-            let errorData = '';
+    // Start the resident Python worker once; models stay loaded between requests
+    startWorker() {
+        if (this.ready) {
+            return this.ready;
+        }
 
-            process.stdout.on('data', (data) => {
-                outputData += data.toString();
+        this.ready = new Promise((resolve, reject) => {
+            const args = [this.scriptPath, '--serve'];
+            if (process.env.DETECTION_BACKEND) {
+                args.push('--backend', process.env.DETECTION_BACKEND);
+            }
+            if (process.env.DETECTION_METRICS_PORT) {
+                args.push('--metrics-port', process.env.DETECTION_METRICS_PORT);
+            }
+            const worker = spawn(this.pythonPath, args, {
+                cwd: path.dirname(this.scriptPath)
             });
+            let started = false;
+            this.worker = worker;
+
+            // A worker hanging while it loads must not leave requests waiting forever
+            const startupTimer = setTimeout(() => {
+                if (!started) {
+                    started = true;
+                    reject(new Error(`Detection worker did not start within ${this.startupTimeout}ms`));
+                    worker.kill();
+                }
+            }, this.startupTimeout);
+
+            worker.stdout.on('data', (data) => {
+                this.buffer += data.toString();
+                let newline;
+                while ((newline = this.buffer.indexOf('\n')) !== -1) {
+                    const line = this.buffer.slice(0, newline).trim();
+                    this.buffer = this.buffer.slice(newline + 1);
+                    if (!line) {
+                        continue;
+                    }
+
+                    let message;
+                    try {
+                        message = JSON.parse(line);
+                    } catch (error) {
+                        console.error('Invalid detection worker output:', line);
+                        continue;
+                    }
 
-            process.stderr.on('data', (data) => {
-                errorData += data.toString();
+                    if (!started) {
+                        started = true;
+                        clearTimeout(startupTimer);
+                        if (message.ready) {
+                            resolve(worker);
+                        } else {
+                            reject(new Error(`Detection worker failed to start: ${message.error}`));
+                        }
+                        continue;
+                    }
+
+                    const request = this.pending.get(message.id);
+                    if (!request) {
+                        continue;
+                    }
+                    this.pending.delete(message.id);
+                    clearTimeout(request.timer);
+                    this.timeouts = 0;
+                    delete message.id;
+
+                    if (message.error) {
+                        request.reject(new Error(`Detection failed: ${message.error}`));
+                    } else {
+                        request.resolve(message);
+                    }
+                }
+            });
+
+            worker.stderr.on('data', (data) => {
+                console.error(`Detection worker: ${data.toString().trim()}`);
             });
 
-            process.on('close', (code) => {
-                if (code !== 0) {
-                    reject(new Error(`Detection failed: ${errorData}`));
+            // Reject everything in flight and forget the worker; 'error' and
+            // 'close' can both fire, so only the first one for this worker counts
+            const fail = (error) => {
+                clearTimeout(startupTimer);
+                if (!started) {
+                    started = true;
+                    reject(error);
+                }
+                if (this.worker !== worker) {
                     return;
                 }
-
-                try {
-                    const result = JSON.parse(outputData);
-                    resolve(result);
-                } catch (error) {
-                    reject(new Error('Invalid detection result format'));
+                for (const request of this.pending.values()) {
+                    clearTimeout(request.timer);
+                    request.reject(error);
                 }
+                this.pending.clear();
+                this.worker = null;
+                this.ready = null;
+                this.buffer = '';
+                this.timeouts = 0;
+            };
+
+            // Spawn failures (e.g. python not on PATH) arrive here instead of throwing
+            worker.on('error', (error) => {
+                console.error(`Detection worker error: ${error.message}`);
+                fail(new Error(`Detection worker failed: ${error.message}`));
+            });
+
+            // Writing to a worker that already died gives EPIPE
+            worker.stdin.on('error', (error) => {
+                console.error(`Detection worker stdin error: ${error.message}`);
+                fail(new Error(`Detection worker failed: ${error.message}`));
+                worker.kill();
+            });
+
+            worker.on('close', (code) => {
+                fail(new Error(`Detection worker exited with code ${code}`));
             });
         });
+
+        return this.ready;
     }
 
-    async detectFromStream(imageBuffer) {
-        const tempPath = path.join(__dirname, '../../uploads/temp_' + Date.now() + '.jpg');
-        
-        try {
-            // Save buffer to temporary file
-            await fs.writeFile(tempPath, imageBuffer);
-            
-            // Process the image
-            const result = await this.detectPlate(tempPath);
-            
-            // Clean up
-            await fs.unlink(tempPath);
-            
-            return result;
-        } catch (error) {
-            // Clean up on error
-            try {
-                await fs.unlink(tempPath);
-            } catch (unlinkError) {
-                console.error('Error cleaning up temporary file:', unlinkError);
-            }
-            
-            throw error;
-        }
+    async sendRequest(request) {
+        const worker = await this.startWorker();
+        const id = this.nextId++;
+
+        return new Promise((resolve, reject) => {
+            // A request the worker never answers must not stay pending forever
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                reject(new Error(`Detection timed out after ${this.requestTimeout}ms`));
+
+                // Kill a wedged worker; 'close' resets it and the next request respawns it
+                this.timeouts++;
+                if (this.timeouts >= this.maxTimeouts && this.worker === worker) {
+                    console.error(`Detection worker timed out ${this.timeouts} times in a row, restarting it`);
+                    worker.kill();
+                }
+            }, this.requestTimeout);
+            this.pending.set(id, { resolve, reject, timer });
+            worker.stdin.write(JSON.stringify({ id, ...request }) + '\n');
+        });
+    }
+
+    async detectPlate(imagePath) {
+        return this.sendRequest({ path: path.resolve(imagePath) });
+    }
+
+    // Accepts a Buffer of encoded image bytes or an already base64-encoded
+    // string; the image goes to the worker in memory, never via a temp file
+    async detectFromStream(image) {
+        const imageB64 = Buffer.isBuffer(image) ? image.toString('base64') : image;
+        return this.sendRequest({ image_b64: imageB64 });
     }
 
     async validateDetection(result) {
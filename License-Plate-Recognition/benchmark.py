@@ -0,0 +1,329 @@
+import argparse
+import json
+import logging
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import cv2
+import numpy as np
+import function.helper as helper
+import function.metrics as metrics
+import function.utils_rotate as utils_rotate
+from function.roi import RegionOfInterest, parse_polygon
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+STAGES = ['decode', 'detector_forward', 'deskew', 'ocr_forward']
+BASELINE_PATH = 'benchmark_baseline.json'
+
+class StageTimes:
+    """Collects raw per-stage durations (in seconds) for percentile reporting"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def summary(self):
+        report = {}
+        for stage, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            report[stage] = {
+                'count': len(ms),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'total_ms': float(ms.sum())
+            }
+        return report
+
+def iter_images(paths):
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(p for p in sorted(path.rglob('*')) if p.suffix.lower() in IMAGE_SUFFIXES)
+        else:
+            files.append(path)
+
+    for path in files:
+        start = time.perf_counter()
+        frame = cv2.imread(str(path))
+        elapsed = time.perf_counter() - start
+        if frame is None:
+            logging.warning(f"Could not read image {path}")
+            continue
+        yield str(path), elapsed, frame
+
+def iter_video(path, max_frames=None):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    try:
+        index = 0
+        while max_frames is None or index < max_frames:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            elapsed = time.perf_counter() - start
+            if not ret:
+                break
+            yield f"{path}#{index}", elapsed, frame
+            index += 1
+    finally:
+        cap.release()
+
+def stage_seconds():
+    """Seconds spent per stage since the last call, from the pipeline's own metrics.
+
+    The stages are the lp_*_seconds timers of the real code paths, so the
+    numbers follow whatever the pipelines actually do.
+    """
+    _, _, histograms = metrics.registry.drain()
+    return {name[len('lp_'):-len('_seconds')]: h.sum for name, h in histograms.items()
+            if name.startswith('lp_') and name.endswith('_seconds')}
+
+def run_detector_pipeline(frame, lp_detector, roi):
+    """LicensePlateDetector.detect_batch, as used by lp_image.py"""
+    _, result = lp_detector.detect_batch([frame], rois=[roi])[0]
+    return [plate['plateNumber'] for plate in result['plates']] if result else []
+
+def run_webcam_pipeline(frame, lp_detector, roi):
+    """webcam.detect_plates with deskew, without tracking"""
+    from webcam import detect_plates
+
+    detections = detect_plates(frame, lp_detector.detector, lp_detector.recognizer, roi=roi)
+    return [lp for _, _, _, _, lp in detections]
+
+PIPELINES = {
+    'detector': run_detector_pipeline,
+    'webcam': run_webcam_pipeline
+}
+
+def run_benchmark(corpus, pipeline, lp_detector, roi=None, warmup_frames=0):
+    times = StageTimes()
+    frames = 0
+    plates = 0
+    wall_start = None
+
+    # Per-stage timings come from the instrumentation in the pipelines
+    metrics.enable()
+    metrics.registry.reset()
+
+    for index, (_, decode_seconds, frame) in enumerate(corpus):
+        if index < warmup_frames:
+            pipeline(frame, lp_detector, roi)
+            stage_seconds()
+            continue
+        if wall_start is None:
+            wall_start = time.perf_counter()
+
+        times.add('decode', decode_seconds)
+        start = time.perf_counter()
+        readings = pipeline(frame, lp_detector, roi)
+        times.add('total', decode_seconds + time.perf_counter() - start)
+        for stage, seconds in stage_seconds().items():
+            times.add(stage, seconds)
+        frames += 1
+        plates += len(readings)
+
+    wall = time.perf_counter() - wall_start if wall_start is not None else 0.0
+    return {
+        'frames': frames,
+        'plates': plates,
+        'wall_seconds': wall,
+        'images_per_second': frames / wall if wall > 0 else None,
+        'stages': times.summary()
+    }
+
+def measure(fn, repeat):
+    """Median wall time of fn over repeat runs, after one untimed run"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def calibration_workload():
+    # Fixed mixed Python/NumPy workload used as the unit of machine speed
+    total = 0
+    for i in range(200000):
+        total += i * i % 7
+    a = np.arange(256 * 256, dtype=np.float32).reshape(256, 256)
+    for _ in range(5):
+        a = (a @ a.T) / a.size
+    return total
+
+def run_gate_benchmarks(frame, repeat, backend='torch'):
+    """Time the per-frame building blocks, normalized by the calibration loop"""
+    from lp_image import LicensePlateDetector
+
+    # Models come from the registry, so this shares them with get_model(..., backend)
+    lp_detector = LicensePlateDetector(backend=backend)
+    crop, _ = lp_detector.detect_batch([frame])[0]
+    if crop is None:
+        # No plate found: use the frame centre so the crop-level stages still run
+        h, w = frame.shape[:2]
+        crop = frame[h // 3:2 * h // 3, w // 4:3 * w // 4]
+    h, w = crop.shape[:2]
+    quad = np.array([[w * 0.05, h * 0.1], [w * 0.95, 0], [w, h * 0.9], [0, h]], dtype="float32")
+
+    benchmarks = {
+        'read_plate': lambda: helper.read_plate(lp_detector.recognizer, crop),
+        'deskew': lambda: utils_rotate.deskew(crop, 0, 0),
+        'changeContrast': lambda: utils_rotate.changeContrast(crop),
+        'four_point_transform': lambda: helper.four_point_transform(crop, quad),
+        'detect_license_plate': lambda: lp_detector.detect_license_plate(frame)
+    }
+
+    calibration = measure(calibration_workload, repeat)
+    results = {}
+    for name, fn in benchmarks.items():
+        seconds = measure(fn, repeat)
+        results[name] = {'seconds': seconds, 'normalized': seconds / calibration}
+    return {'backend': backend, 'calibration_seconds': calibration, 'benchmarks': results}
+
+def compare_to_baseline(current, baseline, tolerance):
+    """Return (rows, regressed) comparing normalized timings against the baseline"""
+    rows = []
+    regressed = False
+    for name, base in baseline['benchmarks'].items():
+        now = current['benchmarks'].get(name)
+        if now is None:
+            rows.append((name, base['normalized'], None, None, 'MISSING'))
+            regressed = True
+            continue
+        change = now['normalized'] / base['normalized'] - 1
+        status = 'REGRESSED' if change > tolerance else 'ok'
+        regressed = regressed or status != 'ok'
+        rows.append((name, base['normalized'], now['normalized'], change, status))
+    return rows, regressed
+
+def run_gate(args):
+    corpus = iter_images(args.images) if args.images else iter_video(args.video, 1)
+    first = next(iter(corpus), None)
+    if first is None:
+        logging.error("Gate needs at least one readable image or video frame")
+        return 1
+    current = run_gate_benchmarks(first[2], args.repeat, args.backend)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        logging.info(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not Path(args.baseline).exists():
+        logging.error(f"Baseline {args.baseline} not found; create it with --gate --save-baseline")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    baseline_backend = baseline.get('backend')
+    if baseline_backend is None:
+        logging.error(f"Baseline {args.baseline} does not record its backend; "
+                      f"record it again with --gate --save-baseline --backend {args.backend}")
+        return 1
+    if baseline_backend != args.backend:
+        logging.error(f"Baseline {args.baseline} was recorded with the {baseline_backend} backend, "
+                      f"not {args.backend}; record one with --gate --save-baseline --backend {args.backend}")
+        return 1
+
+    rows, regressed = compare_to_baseline(current, baseline, args.tolerance)
+    logging.info(f"Calibration loop: {current['calibration_seconds'] * 1000:.2f}ms "
+                 f"(baseline {baseline['calibration_seconds'] * 1000:.2f}ms)")
+    for name, base, now, change, status in rows:
+        if now is None:
+            logging.info(f"{name:>22}: baseline={base:.3f} current=missing {status}")
+        else:
+            logging.info(f"{name:>22}: baseline={base:.3f} current={now:.3f} ({change:+.1%}) {status}")
+
+    if regressed:
+        logging.error(f"Performance regression beyond {args.tolerance:.0%} tolerance")
+        return 1
+    logging.info("No performance regressions")
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the license plate recognition pipeline')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--images', nargs='+', help='image files or directories')
+    source.add_argument('--video', help='video file or stream URL')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop a video after this many frames')
+    parser.add_argument('--pipeline', choices=sorted(PIPELINES), default='detector',
+                        help='detector: lp_image.py path, webcam: webcam.py path with deskew')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch')
+    parser.add_argument('--roi', type=parse_polygon, default=None,
+                        help='polygon the detector is limited to, as JSON [[x, y], ...]')
+    parser.add_argument('--tile-size', type=int, default=0,
+                        help='detector pipeline: also detect on overlapping tiles of this size (0 = off)')
+    parser.add_argument('--warmup-frames', type=int, default=3, help='frames processed before timing starts')
+    parser.add_argument('--output', default='benchmark_report.json', help='where to write the JSON report')
+    parser.add_argument('--gate', action='store_true',
+                        help='compare machine-normalized stage timings against a stored baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON used by --gate')
+    parser.add_argument('--save-baseline', action='store_true', help='with --gate, record a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown per stage before --gate fails (0.2 = 20%%)')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per --gate benchmark')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.gate:
+        return run_gate(args)
+
+    from lp_image import LicensePlateDetector
+
+    lp_detector = LicensePlateDetector(args.backend, tile_size=args.tile_size)
+    roi = RegionOfInterest(args.roi) if args.roi else None
+    corpus = iter_images(args.images) if args.images else iter_video(args.video, args.max_frames)
+
+    report = run_benchmark(corpus, PIPELINES[args.pipeline], lp_detector, roi, args.warmup_frames)
+    report.update({
+        'pipeline': args.pipeline,
+        'backend': args.backend,
+        'roi': args.roi,
+        'tile_size': args.tile_size,
+        'corpus': args.images or args.video,
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version()
+        }
+    })
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for stage in STAGES + ['total']:
+        s = report['stages'].get(stage)
+        if s:
+            logging.info(f"{stage:>10}: p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms "
+                         f"p99={s['p99_ms']:.2f}ms (n={s['count']})")
+    if report['images_per_second']:
+        logging.info(f"Throughput: {report['images_per_second']:.2f} images/sec over {report['frames']} frames")
+    logging.info(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
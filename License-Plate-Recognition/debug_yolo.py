@@ -1,6 +1,6 @@
 import sys
 import logging
-from ultralytics import YOLO
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH, get_model
 import cv2
 import torch
 import os
@@ -23,8 +23,8 @@ try:
 
     # Check model files
     model_files = [
-        'model/LP_detector_nano_61.pt',
-        'model/LP_ocr_nano_62.pt'
+        DETECTOR_PATH,
+        RECOGNIZER_PATH
     ]
     
     for model_path in model_files:
@@ -35,7 +35,7 @@ try:
             
             # Try to load model
             try:
-                model = YOLO(model_path)
+                model = get_model(model_path)
                 logging.info(f"Successfully loaded model: {model_path}")
             except Exception as e:
                 logging.error(f"Error loading model {model_path}: {str(e)}")
@@ -47,7 +47,7 @@ try:
     if os.path.exists(test_image):
         logging.info(f"Test image exists: {test_image}")
         try:
-            model = YOLO('model/LP_detector_nano_61.pt')
+            model = get_model(DETECTOR_PATH)
             results = model(test_image)
             logging.info(f"Inference successful. Detected {len(results[0].boxes)} objects")
         except Exception as e:
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import function.metrics as metrics
+
+class MicroBatcher:
+    """Group concurrent requests into batches for a batch-oriented function.
+
+    Requests submitted while a batch is being collected are held for up to
+    max_wait_ms or until max_batch items arrive, then process_batch runs once
+    over all of them in the executor. Each caller's future receives the
+    result at its own position in the batch. Up to concurrency batches may
+    be in flight at once, e.g. one per process of a worker pool.
+    """
+
+    def __init__(self, process_batch, max_batch=8, max_wait_ms=5.0, executor=None, concurrency=1):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.concurrency = concurrency
+        self.queue = None
+        self.worker = None
+        self.slots = None
+        self.in_flight = set()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.worker = asyncio.create_task(self._run())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        metrics.registry.set_gauge('lp_queue_depth', self.queue.qsize())
+        return await future
+
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            await self.slots.acquire()
+            batch = await self._collect()
+            metrics.registry.set_gauge('lp_queue_depth', self.queue.qsize())
+            metrics.observe('lp_batch_size', len(batch), metrics.COUNT_BUCKETS)
+            task = asyncio.create_task(self._process(batch))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def _process(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.process_batch, items)
+        except Exception as e:
+            logging.error(f"Error processing batch: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -2,6 +2,7 @@ import math
 import cv2
 import numpy as np
 import re
+import function.metrics as metrics
 
 def convert_quad_to_bbox(quad_coords):
     """Convert quadrilateral coordinates to YOLO bbox format (x_center, y_center, width, height)"""
@@ -42,46 +43,173 @@ def process_label_file(label_path, output_path):
     with open(output_path, 'w') as f:
         f.writelines(new_lines)
 
+def boxes_to_numpy(boxes):
+    """Copy an ultralytics Boxes object to an (N, 6) x1, y1, x2, y2, conf, cls array in one transfer"""
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+    if data.size == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    # Tracked boxes carry an extra id column before conf and cls
+    return np.concatenate([data[:, :4], data[:, -2:]], axis=1)
+
+def tile_grid(width, height, tile_size, overlap=0.2):
+    """Top-left corners of tile_size tiles covering a width x height image.
+
+    Neighbouring tiles share about overlap of their size, so a plate cut by
+    one tile's edge lies whole in the next; the last row and column are
+    aligned to the image edge.
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        return positions + [length - tile_size]
+
+    return [(x, y) for y in starts(height) for x in starts(width)]
+
+def nms(boxes, scores, threshold):
+    """Greedy IoU non-maximum suppression; returns kept indices in descending score order"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= threshold]
+    return np.array(keep, dtype=np.int64)
+
+def drop_cut_boxes(boxes, x, y, tile_w, tile_h, width, height, margin=0.02):
+    """Drop frame-coordinate boxes touching an edge of the tile at (x, y) that is inside the image.
+
+    Such boxes are usually plates cut by the tile; with enough overlap the
+    whole plate is found by a neighbouring tile or the full-frame pass.
+    A box counts as touching within margin of the tile's size, since boxes
+    cut by an edge rarely end exactly on it after letterbox rounding.
+    """
+    margin = max(2.0, margin * min(tile_w, tile_h))
+    keep = np.ones(len(boxes), dtype=bool)
+    if x > 0:
+        keep &= boxes[:, 0] > x + margin
+    if y > 0:
+        keep &= boxes[:, 1] > y + margin
+    if x + tile_w < width:
+        keep &= boxes[:, 2] < x + tile_w - margin
+    if y + tile_h < height:
+        keep &= boxes[:, 3] < y + tile_h - margin
+    return boxes[keep]
+
+def merge_tile_boxes(boxes, threshold=0.6):
+    """Merge (N, 6) frame-coordinate boxes from overlapping tiles, most confident first.
+
+    Boxes overlapping by more than threshold of the smaller one's area are
+    the same plate, even when their IoU is low because one is a fragment
+    of the other. The merged box takes the larger box's coordinates, so a
+    confident fragment never replaces the whole plate it lies in, and the
+    higher confidence.
+    """
+    if len(boxes) == 0:
+        return boxes
+    boxes = boxes[np.argsort(-boxes[:, 4], kind='stable')]
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+
+    merged = []
+    merged_areas = []
+    for box, area in zip(boxes, areas):
+        for k, kept in enumerate(merged):
+            iw = min(box[2], kept[2]) - max(box[0], kept[0])
+            ih = min(box[3], kept[3]) - max(box[1], kept[1])
+            inter = max(iw, 0) * max(ih, 0)
+            if inter / (min(area, merged_areas[k]) + 1e-9) <= threshold:
+                continue
+            if area > merged_areas[k]:
+                merged[k] = np.concatenate([box[:4], kept[4:]])
+                merged_areas[k] = area
+            break
+        else:
+            merged.append(box.copy())
+            merged_areas.append(area)
+    return np.stack(merged)
+
+def extract_chars(boxes, names, min_conf=0.25):
+    """Turn character boxes into (plate_number, char_confidences), ordered left to right"""
+    data = boxes_to_numpy(boxes)
+    data = data[data[:, 4] > min_conf]
+    if len(data) == 0:
+        return "", []
+
+    # Sort characters by x-coordinate (left to right)
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    plate_number = "".join(str(names[int(cls)]) for cls in data[:, 5])
+    return plate_number, data[:, 4].tolist()
+
 def read_plate(model, img):
     # YOLOv8 prediction with configuration optimized for character detection
-    results = model.predict(
-        source=img,
-        conf=0.25,     # Lower confidence threshold to detect more characters
-        iou=0.45,      # IOU threshold for NMS
-        max_det=20,    # Maximum detections per image
-        verbose=False  # Suppress output
-    )
+    with metrics.timed('lp_ocr_forward_seconds'):
+        results = model.predict(
+            source=img,
+            conf=0.25,     # Lower confidence threshold to detect more characters
+            iou=0.45,      # IOU threshold for NMS
+            max_det=20,    # Maximum detections per image
+            verbose=False  # Suppress output
+        )
     
     if len(results) == 0 or len(results[0].boxes) == 0:
         return "unknown"
     
-    # Get character detections from first image
-    boxes = results[0].boxes
-    char_list = []
-    
-    # Extract all detections
-    for i in range(len(boxes)):
-        x1 = float(boxes.xyxy[i][0].item())  # Get left x coordinate
-        cls = int(boxes.cls[i].item())       # Get class index
-        conf = float(boxes.conf[i].item())   # Get confidence
-        
-        # Only add high confidence detections
-        if conf > 0.25:
-            char_list.append((x1, cls, conf))
-    
-    if not char_list:
-        return "unknown"
-        
-    # Sort characters by x-coordinate (left to right)
-    char_list.sort(key=lambda x: x[0])
-    
-    # Convert class indices to characters with confidence filtering
-    plate_number = ""
-    for _, cls, conf in char_list:
-        plate_number += str(model.names[cls])
-    
+    plate_number, _ = extract_chars(results[0].boxes, model.names)
     return plate_number if plate_number else "unknown"
 
+# Province code, series (letter plus optional letter/digit), optional '-',
+# then a 4-5 digit number that may be written with a '.' (51F-123.45)
+PLATE_PATTERN = re.compile(r'^\d{2}[A-Z][A-Z0-9]?-?\d{3}\.?\d{1,2}$')
+
+def read_plate_batch(model, imgs):
+    """Read one plate from several candidate images (e.g. deskew variants) in a single batched predict.
+
+    Candidates that look like a Vietnamese plate (PLATE_PATTERN) win over
+    ones that do not; among those, the highest summed character confidence
+    wins, so a full read beats a short partial one with higher per-character
+    confidence. Returns (plate_number, char_confidences), or ("unknown", [])
+    if nothing was read.
+    """
+    imgs = [img for img in imgs if img is not None]
+    if not imgs:
+        return "unknown", []
+
+    metrics.inc('lp_ocr_candidates_total', len(imgs))
+    with metrics.timed('lp_ocr_forward_seconds'):
+        results = model.predict(
+            source=imgs,
+            conf=0.25,
+            iou=0.45,
+            max_det=20,
+            verbose=False
+        )
+
+    best_plate, best_confs, best_score = "unknown", [], None
+    for result in results:
+        plate_number, confs = extract_chars(result.boxes, model.names)
+        if not plate_number:
+            continue
+
+        score = (bool(PLATE_PATTERN.match(plate_number)), sum(confs))
+        if best_score is None or score > best_score:
+            best_plate, best_confs, best_score = plate_number, confs, score
+
+    return best_plate, best_confs
+
 def linear_equation(x1, y1, x2, y2):
     if x2 - x1 == 0:  # Vertical line
         return None, x1
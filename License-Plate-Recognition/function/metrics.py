@@ -0,0 +1,224 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, and buckets for per-frame counts
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+class Histogram:
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Approximate quantile: upper bound of the bucket holding the q-th observation"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms keyed by metric name"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def drain(self):
+        """Return and clear everything recorded so far, e.g. to ship it to another process"""
+        with self.lock:
+            snapshot = (self.counters, self.gauges, self.histograms)
+            self.counters, self.gauges, self.histograms = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a drained snapshot from another registry into this one"""
+        counters, gauges, histograms = snapshot
+        with self.lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.gauges.update(gauges)
+            for name, other in histograms.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    self.histograms[name] = other
+                    continue
+                histogram.counts = [a + b for a, b in zip(histogram.counts, other.counts)]
+                histogram.count += other.count
+                histogram.sum += other.sum
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def log_summary(self):
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                logging.info(f"{name}: {value}")
+            for name, value in sorted(self.gauges.items()):
+                logging.info(f"{name}: {value}")
+            for name, h in sorted(self.histograms.items()):
+                if h.count:
+                    logging.info(f"{name}: n={h.count} mean={h.sum / h.count:.4f} "
+                                 f"p50<={h.quantile(0.5)} p95<={h.quantile(0.95)} p99<={h.quantile(0.99)}")
+
+registry = MetricsRegistry()
+
+# Instrumentation is off unless LP_METRICS is set or enable() is called;
+# hook sites check this flag so the disabled cost is one attribute lookup
+enabled = os.environ.get('LP_METRICS', '') not in ('', '0')
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timed(name):
+    """Context manager recording the block's duration into histogram name when enabled"""
+    return _Timer(name) if enabled else _NULL_TIMER
+
+def inc(name, value=1):
+    if enabled:
+        registry.inc(name, value)
+
+def observe(name, value, buckets=TIME_BUCKETS):
+    if enabled:
+        registry.observe(name, value, buckets)
+
+def rss_bytes():
+    """Resident set size of this process, or None if it cannot be determined"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _base_name(name):
+    # Series names may carry labels, e.g. 'lp_model_load_seconds{model="x"}'
+    return name.split('{', 1)[0]
+
+def render_prometheus(reg=None):
+    """Render the registry in the Prometheus text exposition format"""
+    reg = reg or registry
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        base = _base_name(name)
+        if base not in typed:
+            typed.add(base)
+            lines.append(f"# TYPE {base} {kind}")
+
+    rss = rss_bytes()
+    if rss is not None:
+        reg.set_gauge('process_resident_memory_bytes', rss)
+
+    with reg.lock:
+        for name, value in sorted(reg.counters.items()):
+            declare(name, 'counter')
+            lines.append(f"{name} {_format_value(value)}")
+        for name, value in sorted(reg.gauges.items()):
+            declare(name, 'gauge')
+            lines.append(f"{name} {_format_value(value)}")
+        for name, h in sorted(reg.histograms.items()):
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(h.buckets + (float('inf'),), h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f"{name}_sum {_format_value(h.sum)}")
+            lines.append(f"{name}_count {h.count}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the worker's log
+        pass
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics on a daemon thread and enable recording"""
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
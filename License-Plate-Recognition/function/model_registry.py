@@ -0,0 +1,64 @@
+import logging
+import os
+import threading
+import time
+import function.metrics as metrics
+
+DETECTOR_PATH = 'model/LP_detector_nano_61.pt'
+RECOGNIZER_PATH = 'model/LP_ocr_nano_62.pt'
+
+# Number of dummy passes run right after a model is loaded
+WARMUP_RUNS = int(os.environ.get('LP_WARMUP_RUNS', '1'))
+
+_models = {}
+_lock = threading.Lock()
+
+def resolve_model_path(model_path, backend='torch'):
+    """Path of the file the backend actually loads, exporting .pt models to ONNX if needed"""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model not found: {model_path}")
+    if backend == 'onnx' and not model_path.endswith('.onnx'):
+        from function.onnx_backend import export_onnx
+        return export_onnx(model_path)
+    return model_path
+
+def load_model(model_path, backend='torch'):
+    """Load a model for the given backend; .onnx files always go through onnxruntime"""
+    model_path = resolve_model_path(model_path, backend)
+
+    if model_path.endswith('.onnx'):
+        from function.onnx_backend import OnnxYOLO
+        return OnnxYOLO(model_path)
+
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+def warmup_model(model, runs=WARMUP_RUNS, imgsz=640):
+    import numpy as np
+
+    # Dummy passes so the first real request does not pay for lazy graph setup
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model.predict(source=dummy, verbose=False)
+
+def get_model(model_path, backend='torch', warmup=WARMUP_RUNS):
+    """Return the process-wide instance of a model, loading and warming it up on first use"""
+    key = (os.path.abspath(model_path), backend)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.perf_counter()
+            model = load_model(model_path, backend)
+            warmup_model(model, warmup)
+            elapsed = time.perf_counter() - start
+            metrics.registry.set_gauge(
+                f'lp_model_load_seconds{{model="{os.path.basename(model_path)}",backend="{backend}"}}', elapsed)
+            logging.info(f"Loaded {model_path} ({backend}) in {elapsed:.2f}s")
+            _models[key] = model
+    return model
+
+def get_detector(backend='torch', warmup=WARMUP_RUNS):
+    return get_model(DETECTOR_PATH, backend, warmup)
+
+def get_recognizer(backend='torch', warmup=WARMUP_RUNS):
+    return get_model(RECOGNIZER_PATH, backend, warmup)
@@ -0,0 +1,45 @@
+import cv2
+
+class MotionGate:
+    """Cheap check for whether a frame changed enough to be worth detecting on.
+
+    Frames are shrunk to width pixels wide, greyed and blurred, then compared
+    with a running-average background. The detector should run when more
+    than min_changed of the pixels differ by over pixel_threshold, and at
+    least every refresh_every frames regardless, so a plate that stopped
+    in view is still picked up eventually.
+    """
+
+    def __init__(self, min_changed=0.01, pixel_threshold=25, refresh_every=30, width=160, learning_rate=0.05):
+        self.min_changed = min_changed
+        self.pixel_threshold = pixel_threshold
+        self.refresh_every = refresh_every
+        self.width = width
+        self.learning_rate = learning_rate
+        self.background = None
+        self.since_detect = 0
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0).astype('float32')
+
+    def changed_fraction(self, frame):
+        """Fraction of pixels that differ from the background; updates the background"""
+        current = self._prepare(frame)
+        if self.background is None or self.background.shape != current.shape:
+            self.background = current
+            return 1.0
+
+        diff = cv2.absdiff(current, self.background)
+        cv2.accumulateWeighted(current, self.background, self.learning_rate)
+        return float((diff > self.pixel_threshold).mean())
+
+    def should_detect(self, frame):
+        changed = self.changed_fraction(frame)
+        self.since_detect += 1
+        if changed >= self.min_changed or self.since_detect >= self.refresh_every:
+            self.since_detect = 0
+            return True
+        return False
@@ -0,0 +1,138 @@
+import ast
+import logging
+import os
+import cv2
+import numpy as np
+from function.helper import nms
+
+def onnx_path_for(model_path):
+    return os.path.splitext(model_path)[0] + '.onnx'
+
+def export_onnx(model_path, imgsz=640):
+    """Export a .pt model to ONNX next to the original and return the ONNX path.
+
+    The export is cached: it only runs again when the .pt file is newer.
+    """
+    onnx_path = onnx_path_for(model_path)
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path):
+        return onnx_path
+
+    from ultralytics import YOLO
+    logging.info(f"Exporting {model_path} to ONNX...")
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+def letterbox(img, size):
+    """Resize keeping aspect ratio and pad to size x size, like ultralytics does"""
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, r, (left, top)
+
+class OnnxBoxes:
+    """Minimal stand-in for ultralytics Boxes backed by an (N, 6) NumPy array"""
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def xyxy(self):
+        return self.data[:, :4]
+
+    @property
+    def conf(self):
+        return self.data[:, 4]
+
+    @property
+    def cls(self):
+        return self.data[:, 5]
+
+    def __len__(self):
+        return len(self.data)
+
+class OnnxResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class OnnxYOLO:
+    """Run an exported YOLOv8 ONNX model through onnxruntime on CPU.
+
+    Exposes the subset of the ultralytics YOLO interface the pipeline uses
+    (predict/__call__ and names), with NumPy preprocessing and NMS.
+    """
+
+    def __init__(self, model_path, imgsz=640):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Worker pools cap threads per process through OMP_NUM_THREADS
+        options.intra_op_num_threads = int(os.environ.get('OMP_NUM_THREADS', '0'))
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Static exports fix the input size; dynamic ones use imgsz
+        input_shape = self.session.get_inputs()[0].shape
+        self.imgsz = input_shape[2] if isinstance(input_shape[2], int) else imgsz
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+
+    def _preprocess(self, images):
+        batch = []
+        meta = []
+        for img in images:
+            padded, r, pad = letterbox(img, self.imgsz)
+            batch.append(padded[:, :, ::-1].transpose(2, 0, 1))  # BGR HWC -> RGB CHW
+            meta.append((r, pad, img.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+        return batch, meta
+
+    def _postprocess(self, pred, meta, conf, iou, max_det):
+        r, (pad_x, pad_y), (h, w) = meta
+        pred = pred.T  # (anchors, 4 + classes)
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        confs = scores[np.arange(len(scores)), cls]
+        mask = confs > conf
+        pred, cls, confs = pred[mask], cls[mask], confs[mask]
+        if len(pred) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+
+        # cx, cy, w, h -> x1, y1, x2, y2
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, 0] = pred[:, 0] - pred[:, 2] / 2
+        boxes[:, 1] = pred[:, 1] - pred[:, 3] / 2
+        boxes[:, 2] = pred[:, 0] + pred[:, 2] / 2
+        boxes[:, 3] = pred[:, 1] + pred[:, 3] / 2
+
+        # Class-aware NMS by offsetting boxes per class
+        keep = nms(boxes + cls[:, None] * 7680.0, confs, iou)[:max_det]
+        boxes, cls, confs = boxes[keep], cls[keep], confs[keep]
+
+        # Undo letterbox
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / r).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / r).clip(0, h)
+        return np.concatenate([boxes, confs[:, None], cls[:, None]], axis=1).astype(np.float32)
+
+    def predict(self, source, conf=0.25, iou=0.7, max_det=300, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        images = [cv2.imread(img) if isinstance(img, str) else img for img in images]
+        if not images:
+            return []
+
+        batch, meta = self._preprocess(images)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return [OnnxResult(OnnxBoxes(self._postprocess(pred, m, conf, iou, max_det)))
+                for pred, m in zip(output, meta)]
+
+    __call__ = predict
@@ -0,0 +1,63 @@
+import json
+import cv2
+import numpy as np
+
+def parse_polygon(text):
+    """Parse a polygon given as JSON, e.g. '[[0, 400], [1920, 400], [1920, 1080], [0, 1080]]'"""
+    points = json.loads(text)
+    if len(points) < 3:
+        raise ValueError(f"A region of interest needs at least 3 points, got {len(points)}")
+    return points
+
+class RegionOfInterest:
+    """Polygonal region of a camera view that plates can appear in.
+
+    crop() returns the polygon's bounding rectangle, with the pixels outside
+    the polygon blacked out when mask_outside is set, so the detector sees
+    a smaller input and nothing from outside the lane. to_frame() moves
+    boxes found in the crop back to full-frame coordinates.
+    """
+
+    def __init__(self, polygon, mask_outside=True):
+        self.polygon = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError("A region of interest needs at least 3 points")
+        self.mask_outside = mask_outside
+        self.frame_shape = None
+        self.rect = None
+        self.mask = None
+
+    def _prepare(self, shape):
+        h, w = shape[:2]
+        x, y, rw, rh = cv2.boundingRect(self.polygon)
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(w, x + rw), min(h, y + rh)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Region of interest lies outside the {w}x{h} frame")
+
+        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.fillPoly(mask, [self.polygon - (x1, y1)], 255)
+        # A rectangular polygon needs no masking, only the crop
+        self.mask = mask if self.mask_outside and not mask.all() else None
+        self.rect = (x1, y1, x2, y2)
+        self.frame_shape = shape[:2]
+
+    def validate(self, shape):
+        """Raise ValueError if the region does not overlap a frame of this shape"""
+        if self.frame_shape != shape[:2]:
+            self._prepare(shape)
+
+    def crop(self, frame):
+        self.validate(frame.shape)
+        x1, y1, x2, y2 = self.rect
+        region = frame[y1:y2, x1:x2]
+        if self.mask is None:
+            return region
+        return cv2.bitwise_and(region, region, mask=self.mask)
+
+    def to_frame(self, boxes):
+        """Shift an (N, 4+) array of x1, y1, x2, y2, ... boxes from crop to frame coordinates"""
+        x1, y1 = self.rect[:2]
+        shift = np.zeros(boxes.shape[1], dtype=boxes.dtype)
+        shift[:4] = (x1, y1, x1, y1)
+        return boxes + shift
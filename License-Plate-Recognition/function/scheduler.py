@@ -0,0 +1,49 @@
+import math
+
+DEFAULT_FPS = 25.0
+MAX_FPS = 240.0
+
+def usable_fps(fps, default=DEFAULT_FPS):
+    """fps if it is a plausible frame rate, else default.
+
+    Streams often report 0, NaN or a time base such as 90000 as their rate;
+    NaN would break the adaptive interval and 90000 would pin it at max.
+    """
+    if fps is None or not math.isfinite(fps) or not 0 < fps <= MAX_FPS:
+        return default
+    return fps
+
+class FrameScheduler:
+    """Decide which frames of a video to run detection on.
+
+    With a fixed interval every Nth frame is processed. In adaptive mode the
+    interval follows the measured inference latency: processing one frame
+    every ceil(latency * source_fps) frames keeps the run at the source's
+    real-time rate, so a live stream never falls behind.
+    """
+
+    def __init__(self, every=1, adaptive=False, source_fps=25.0, max_every=30, smoothing=0.2):
+        self.every = max(1, every)
+        self.adaptive = adaptive
+        self.source_fps = source_fps
+        self.max_every = max_every
+        self.smoothing = smoothing
+        self.latency = None
+        self.next_frame = 0
+
+    def should_process(self, index):
+        if index < self.next_frame:
+            return False
+        self.next_frame = index + self.every
+        return True
+
+    def record(self, seconds):
+        """Feed back the latency of a processed frame; adapts the interval if enabled"""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+
+        if self.adaptive:
+            every = math.ceil(self.latency * self.source_fps)
+            self.every = min(self.max_every, max(1, every))
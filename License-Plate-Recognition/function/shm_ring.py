@@ -0,0 +1,133 @@
+import logging
+import sys
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+# Descriptor of one frame in a ring; small enough to send through any queue
+FrameRef = namedtuple('FrameRef', ['ring', 'slot', 'seq', 'shape', 'dtype'])
+
+DEFAULT_FRAME_BYTES = 1920 * 1080 * 3
+_ALIGN = 64
+
+def _aligned(size):
+    return -(-size // _ALIGN) * _ALIGN
+
+def _header_bytes(slots):
+    return _aligned(16 + slots * 8)
+
+class FrameRing:
+    """Fixed-size ring of frame slots in a multiprocessing.shared_memory block.
+
+    The creating process owns the block; producers write() frames into the
+    next slot and pass the returned FrameRef to consumers, which attach() by
+    name and read() the frame as a NumPy view without copying. Each slot
+    carries a sequence number, so a consumer can tell when a slow read was
+    overtaken by the producer wrapping around (stale() / read() -> None).
+
+    Writes are expected from a single producer per ring.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        # Header: slot count, slot size, then one sequence number per slot
+        self.slots, self.frame_bytes = (int(v) for v in np.ndarray((2,), dtype=np.int64, buffer=shm.buf))
+        self.header = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=16)
+        self.data_offset = _header_bytes(self.slots)
+        self.next_seq = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, slots=8, frame_bytes=DEFAULT_FRAME_BYTES, name=None):
+        frame_bytes = _aligned(frame_bytes)
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=_header_bytes(slots) + slots * frame_bytes)
+        np.ndarray((2,), dtype=np.int64, buffer=shm.buf)[:] = (slots, frame_bytes)
+        ring = cls(shm, owner=True)
+        ring.header[:] = -1
+        logging.info(f"Created frame ring {shm.name}: {slots} slots of {frame_bytes / 1e6:.1f}MB")
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        # Only the owner may unlink the block. Attaching must not register it
+        # with the resource tracker, which would unlink it when this process
+        # exits (or, when the tracker is shared, drop the owner's entry)
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    def _offset(self, slot):
+        return self.data_offset + slot * self.frame_bytes
+
+    def fits(self, frame):
+        return frame.nbytes <= self.frame_bytes
+
+    def write(self, frame):
+        """Copy frame into the next slot and return its FrameRef"""
+        if not self.fits(frame):
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds ring slot size {self.frame_bytes}")
+        seq = self.next_seq
+        slot = seq % self.slots
+        self.next_seq += 1
+
+        # Mark the slot as being written so readers never trust a torn frame
+        self.header[slot] = -1
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=self._offset(slot))
+        np.copyto(view, frame, casting='no')
+        self.header[slot] = seq
+        return FrameRef(self.name, slot, seq, frame.shape, frame.dtype.str)
+
+    def stale(self, ref):
+        return int(self.header[ref.slot]) != ref.seq
+
+    def read(self, ref):
+        """Zero-copy view of the referenced frame, or None if it was overwritten.
+
+        The view aliases the slot; check stale(ref) again after using it if
+        the producer may have wrapped around in the meantime.
+        """
+        if self.stale(ref):
+            return None
+        return np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=self.shm.buf, offset=self._offset(ref.slot))
+
+    def close(self):
+        # Views handed out by read() must be gone before the mapping closes
+        self.header = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class RingReader:
+    """Attaches to rings on first use and resolves FrameRefs into views"""
+
+    def __init__(self):
+        self.rings = {}
+
+    def ring(self, name):
+        ring = self.rings.get(name)
+        if ring is None:
+            ring = self.rings[name] = FrameRing.attach(name)
+        return ring
+
+    def read(self, ref):
+        return self.ring(ref.ring).read(ref)
+
+    def stale(self, ref):
+        return self.ring(ref.ring).stale(ref)
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
@@ -0,0 +1,110 @@
+import json
+import logging
+import sys
+import threading
+import cv2
+
+class LatestFrameStream:
+    """Capture thread for one camera that only keeps the newest frame.
+
+    Frames the consumer does not pick up in time are overwritten, so a slow
+    detector never builds a backlog. Streams that drop are reopened after
+    reconnect_delay seconds; files stop at their end.
+    """
+
+    def __init__(self, name, source, reconnect_delay=2.0):
+        self.name = name
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.frame = None
+        self.seq = 0
+        self.taken = 0
+        self.finished = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'capture-{name}', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _is_file(self):
+        return isinstance(self.source, str) and '://' not in self.source
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            vid = cv2.VideoCapture(self.source)
+            if not vid.isOpened():
+                logging.error(f"[{self.name}] Could not open {self.source}")
+            else:
+                logging.info(f"[{self.name}] Opened {self.source}")
+                while not self.stop_event.is_set():
+                    ret, frame = vid.read()
+                    if not ret:
+                        break
+                    with self.lock:
+                        self.frame = frame
+                        self.seq += 1
+            vid.release()
+
+            if self._is_file():
+                break
+            logging.warning(f"[{self.name}] Stream lost, reconnecting in {self.reconnect_delay}s")
+            self.stop_event.wait(self.reconnect_delay)
+        self.finished = True
+
+    def latest(self):
+        """Return (seq, frame) if a frame arrived since the last call, else None"""
+        with self.lock:
+            if self.frame is None or self.seq == self.taken:
+                return None
+            self.taken = self.seq
+            return self.seq, self.frame
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+
+class JsonLinesSink:
+    """Write result records as JSON lines to a file, or to stdout for '-'"""
+
+    def __init__(self, target='-'):
+        self.target = target
+        self.file = sys.stdout if target == '-' else open(target, 'a')
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+def open_sinks(targets):
+    """One sink per distinct target, so cameras sharing a target share the file"""
+    sinks = {}
+    for target in targets:
+        if target not in sinks:
+            sinks[target] = JsonLinesSink(target)
+    return sinks
+
+def round_robin(streams, start, max_batch):
+    """Pick up to max_batch streams with a new frame, starting at index start.
+
+    Returns (picks, next_start) where picks is a list of (stream, seq, frame);
+    rotating the start keeps cameras beyond max_batch from being starved.
+    """
+    picks = []
+    count = len(streams)
+    for offset in range(count):
+        stream = streams[(start + offset) % count]
+        latest = stream.latest()
+        if latest is None:
+            continue
+        picks.append((stream,) + latest)
+        if len(picks) == max_batch:
+            return picks, (start + offset + 1) % count
+    return picks, start
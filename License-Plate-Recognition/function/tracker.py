@@ -0,0 +1,140 @@
+import math
+import itertools
+
+def iou(box_a, box_b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes"""
+    ix1 = max(box_a[0], box_b[0])
+    iy1 = max(box_a[1], box_b[1])
+    ix2 = min(box_a[2], box_b[2])
+    iy2 = min(box_a[3], box_b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return inter / float(area_a + area_b - inter)
+
+def centroid_distance(box_a, box_b):
+    ax, ay = (box_a[0] + box_a[2]) / 2, (box_a[1] + box_a[3]) / 2
+    bx, by = (box_b[0] + box_b[2]) / 2, (box_b[1] + box_b[3]) / 2
+    return math.hypot(ax - bx, ay - by)
+
+class Track:
+    def __init__(self, track_id, bbox):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.plate = "unknown"
+        self.confidence = 0.0
+        self.hits = 1
+        self.missed = 0
+        self.finalized = False
+        self.stable_count = 0
+        # Per plate length: number of readings and per-position {char: weight} votes
+        self.readings = {}
+        self.votes = {}
+
+    def add_vote(self, plate, char_confs):
+        """Accumulate one reading and return the current consensus (plate, confidence)"""
+        length = len(plate)
+        self.readings[length] = self.readings.get(length, 0) + 1
+        positions = self.votes.setdefault(length, [{} for _ in range(length)])
+        for position, char, conf in zip(positions, plate, char_confs):
+            position[char] = position.get(char, 0.0) + conf
+
+        # Pick the plate length with the most readings, then the heaviest char per position
+        length = max(self.readings, key=lambda k: (self.readings[k], k))
+        count = self.readings[length]
+        consensus = ""
+        support = []
+        for position in self.votes[length]:
+            char, weight = max(position.items(), key=lambda item: item[1])
+            consensus += char
+            support.append(weight / count)
+        return consensus, sum(support) / len(support)
+
+class PlateTracker:
+    """Lightweight IoU/centroid tracker for plate boxes across frames.
+
+    Boxes are greedily matched to existing tracks by IoU, falling back to
+    centroid distance for small fast-moving plates.
+
+    Readings of a track are combined by confidence-weighted votes per
+    character position, and the track keeps asking for OCR until it is
+    finalized: once the consensus stays unchanged for finalize_after
+    readings with a confidence of at least min_confidence. After that it
+    never triggers OCR again, so OCR runs a few times per vehicle rather
+    than on every frame, and one wrong first read is outvoted.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.5, max_missed=10,
+                 min_confidence=0.8, finalize_after=3):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance  # fraction of the track's box diagonal
+        self.max_missed = max_missed
+        self.min_confidence = min_confidence
+        self.finalize_after = finalize_after
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        """Match (x1, y1, x2, y2) boxes to tracks; returns one Track per box, in order."""
+        pairs = []
+        for bi, box in enumerate(boxes):
+            for ti, track in enumerate(self.tracks):
+                overlap = iou(box, track.bbox)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, bi, ti))
+                    continue
+                diagonal = math.hypot(track.bbox[2] - track.bbox[0], track.bbox[3] - track.bbox[1])
+                distance = centroid_distance(box, track.bbox)
+                if diagonal > 0 and distance <= self.max_distance * diagonal:
+                    # Rank centroid matches below any IoU match
+                    pairs.append((-distance / diagonal, bi, ti))
+
+        assigned = [None] * len(boxes)
+        used = set()
+        for _, bi, ti in sorted(pairs, reverse=True):
+            if assigned[bi] is not None or ti in used:
+                continue
+            assigned[bi] = self.tracks[ti]
+            used.add(ti)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in used:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        for bi, box in enumerate(boxes):
+            track = assigned[bi]
+            if track is None:
+                track = Track(next(self._ids), box)
+                self.tracks.append(track)
+            else:
+                track.bbox = box
+                track.hits += 1
+                track.missed = 0
+            assigned[bi] = track
+
+        return assigned
+
+    def needs_ocr(self, track):
+        # Voting needs several readings; only a finalized track is settled
+        return not track.finalized
+
+    def record_reading(self, track, plate, char_confs):
+        """Vote a new reading into the track.
+
+        Returns True exactly once per track, when its reading becomes final.
+        """
+        if track.finalized or plate == "unknown" or len(char_confs) != len(plate):
+            return False
+
+        consensus, confidence = track.add_vote(plate, char_confs)
+        track.stable_count = track.stable_count + 1 if consensus == track.plate else 1
+        track.plate = consensus
+        track.confidence = confidence
+
+        if track.stable_count >= self.finalize_after and confidence >= self.min_confidence:
+            track.finalized = True
+            return True
+        return False
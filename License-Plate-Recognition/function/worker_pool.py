@@ -0,0 +1,312 @@
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import function.metrics as metrics
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH, resolve_model_path
+from function.shm_ring import DEFAULT_FRAME_BYTES, FrameRef, FrameRing, RingReader
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def _snapshot(index):
+    # Worker metrics travel back with each message; the parent serves /metrics.
+    # The parent's own RSS says nothing about the workers, so each reports its own
+    if not metrics.enabled:
+        return None
+    counters, gauges, histograms = metrics.registry.drain()
+    rss = metrics.rss_bytes()
+    if rss is not None:
+        gauges[f'process_resident_memory_bytes{{worker="{index}"}}'] = rss
+    return counters, gauges, histograms
+
+def _worker_main(index, cpus, threads, backend, detector_path, recognizer_path, tile_size,
+                 record_metrics, tasks, results):
+    metrics.enable(record_metrics)
+
+    # Thread limits must be in place before torch/onnxruntime spin up their pools
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+
+    try:
+        from lp_image import LicensePlateDetector
+        detector = LicensePlateDetector(backend, detector_path, recognizer_path, tile_size=tile_size)
+    except Exception as e:
+        results.put(('ready', index, str(e), _snapshot(index)))
+        return
+    results.put(('ready', index, None, _snapshot(index)))
+
+    reader = RingReader()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, images = task
+        # Tell the parent who holds the task, so it can fail just this one if we die
+        results.put(('taken', index, task_id))
+        try:
+            outputs = _detect_frames(detector, reader, images)
+            results.put(('done', index, task_id, outputs, None, _snapshot(index)))
+        except Exception as e:
+            results.put(('done', index, task_id, None, str(e), _snapshot(index)))
+    reader.close()
+
+_OVERWRITTEN = {'error': 'Frame was overwritten before it was processed'}
+
+def _detect_frames(detector, reader, images):
+    # Frames sent as FrameRefs are read in place from shared memory
+    frames = [reader.read(image) if isinstance(image, FrameRef) else image for image in images]
+    outputs = [(None, _OVERWRITTEN)] * len(images)
+    valid = [idx for idx, frame in enumerate(frames) if frame is not None]
+
+    # Plate crops stay in the worker; only the result dicts travel back
+    detected = detector.detect_batch([frames[idx] for idx in valid])
+    for idx, (_, result) in zip(valid, detected):
+        if isinstance(images[idx], FrameRef) and reader.stale(images[idx]):
+            continue  # the producer wrapped around while we were reading
+        outputs[idx] = (None, result)
+
+    dropped = sum(1 for _, result in outputs if result is _OVERWRITTEN)
+    if dropped:
+        metrics.inc('lp_frames_dropped_total', dropped)
+    return outputs
+
+class WorkerPool:
+    """Pool of processes that each hold their own LicensePlateDetector.
+
+    Every worker gets threads_per_worker intra-op threads and, with pin_cpus,
+    its own slice of the CPUs this process may run on. Batches go through a
+    shared task queue, so whichever worker is idle picks up the next one.
+    detect_batch mirrors LicensePlateDetector.detect_batch, except that the
+    plate region of each result is always None.
+
+    With ring_slots, decoded images are copied once into a shared-memory
+    FrameRing and workers read them in place; only FrameRef descriptors go
+    through the task queue. Capture processes with their own FrameRing may
+    submit FrameRefs directly.
+
+    When metrics are enabled, each worker's stage timings, counters, model
+    load gauges and resident memory (labeled by worker) are shipped back with
+    its results and merged into this process's registry, so /metrics covers
+    the whole pool.
+
+    start() raises RuntimeError if a worker fails to load, dies before it
+    is ready or none is ready within start_timeout seconds. A worker that
+    dies later is restarted and only the batch it was processing fails. After max_restarts crashes the pool gives up and fails every
+    request, so the supervising service can restart the whole process.
+    """
+
+    def __init__(self, workers, threads_per_worker=None, pin_cpus=False, backend='torch',
+                 detector_path=DETECTOR_PATH, recognizer_path=RECOGNIZER_PATH,
+                 ring_slots=0, ring_frame_bytes=DEFAULT_FRAME_BYTES, tile_size=0, max_restarts=5,
+                 start_timeout=600.0):
+        cpus = available_cpus()
+        self.workers = workers
+        self.threads = threads_per_worker or max(1, len(cpus) // workers)
+        self.pin_cpus = pin_cpus
+        self.backend = backend
+        self.detector_path = detector_path
+        self.recognizer_path = recognizer_path
+        self.cpus = cpus
+        self.processes = []
+        self.assigned = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.closing = False
+        self.broken = False
+        self.restarts = 0
+        self.max_restarts = max_restarts
+        self.start_timeout = start_timeout
+        self.ring_slots = ring_slots
+        self.tile_size = tile_size
+        self.ring_frame_bytes = ring_frame_bytes
+        self.ring = None
+        self.ring_lock = threading.Lock()
+
+    def _cpu_slice(self, index):
+        if not self.pin_cpus:
+            return None
+        start = (index * self.threads) % len(self.cpus)
+        return [self.cpus[(start + i) % len(self.cpus)] for i in range(self.threads)]
+
+    def start(self):
+        # Export ONNX models once here; workers exporting the same files
+        # concurrently could load each other's half-written output
+        self.detector_path = resolve_model_path(self.detector_path, self.backend)
+        self.recognizer_path = resolve_model_path(self.recognizer_path, self.backend)
+
+        # spawn keeps CUDA/OpenMP state of the parent out of the workers
+        self.ctx = mp.get_context('spawn')
+        if self.ring_slots:
+            self.ring = FrameRing.create(self.ring_slots, self.ring_frame_bytes)
+        self.tasks = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.processes = [self._spawn(index) for index in range(self.workers)]
+
+        try:
+            self._wait_ready()
+        except RuntimeError:
+            self.close()
+            raise
+        logging.info(f"Started {self.workers} detection workers with {self.threads} threads each")
+
+        self.collector = threading.Thread(target=self._collect, name='pool-results', daemon=True)
+        self.collector.start()
+        return self
+
+    def _wait_ready(self):
+        # A worker killed while loading (OOM, crash in torch) never reports
+        # 'ready', so waiting on the queue alone could block forever
+        deadline = time.monotonic() + self.start_timeout
+        ready = set()
+        while len(ready) < self.workers:
+            try:
+                _, index, error, snapshot = self.results.get(timeout=0.5)
+            except queue.Empty:
+                for index, process in enumerate(self.processes):
+                    if index not in ready and process.exitcode is not None:
+                        raise RuntimeError(f"Worker {index} exited with code {process.exitcode} before it was ready")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Workers did not start within {self.start_timeout:.0f}s")
+                continue
+            self._merge_metrics(snapshot)
+            if error is not None:
+                raise RuntimeError(f"Worker {index} failed to start: {error}")
+            ready.add(index)
+
+    def _spawn(self, index):
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self._cpu_slice(index), self.threads, self.backend,
+                  self.detector_path, self.recognizer_path, self.tile_size, metrics.enabled,
+                  self.tasks, self.results),
+            name=f'detector-{index}',
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _collect(self):
+        while not self.closing:
+            try:
+                message = self.results.get(timeout=0.5)
+            except queue.Empty:
+                message = None
+
+            if message is not None:
+                self._handle(message)
+            if not self.closing:
+                self._restart_dead()
+
+    def _handle(self, message):
+        kind, index = message[0], message[1]
+        if kind == 'ready':
+            self._merge_metrics(message[3])
+            if message[2] is not None:
+                logging.error(f"Restarted worker {index} failed to start: {message[2]}")
+            else:
+                logging.info(f"Worker {index} is back")
+            return
+        if kind == 'taken':
+            self.assigned[index] = message[2]
+            return
+
+        _, index, task_id, outputs, error, snapshot = message
+        self._merge_metrics(snapshot)
+        self.assigned.pop(index, None)
+        self._resolve(task_id, outputs, error)
+
+    def _merge_metrics(self, snapshot):
+        if snapshot is not None:
+            metrics.registry.merge(snapshot)
+
+    def _resolve(self, task_id, outputs, error):
+        with self.lock:
+            future = self.pending.pop(task_id, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(outputs)
+
+    def _restart_dead(self):
+        if not self.broken:
+            for index, process in enumerate(self.processes):
+                # A worker that failed to (re)start exits cleanly; leave its slot empty
+                if process.is_alive() or process.exitcode == 0:
+                    continue
+                task_id = self.assigned.pop(index, None)
+                if task_id is not None:
+                    self._resolve(task_id, None, f"Detection worker {index} crashed")
+                if self.restarts >= self.max_restarts:
+                    logging.error(f"Worker {index} exited with code {process.exitcode}; too many crashes, giving up")
+                    self.broken = True
+                    break
+                logging.error(f"Worker {index} exited with code {process.exitcode}; restarting it")
+                self.restarts += 1
+                self.processes[index] = self._spawn(index)
+
+            if not any(process.is_alive() for process in self.processes):
+                self.broken = True
+        if self.broken:
+            self._fail_all(RuntimeError("No detection workers are running"))
+
+    def _fail_all(self, error):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def submit(self, images):
+        """Queue a batch of images; returns a Future of its detect_batch outputs"""
+        future = Future()
+        if self.broken:
+            future.set_exception(RuntimeError("No detection workers are running"))
+            return future
+        task_id = next(self.ids)
+        images = [self._to_ring(image) for image in images]
+        with self.lock:
+            self.pending[task_id] = future
+        self.tasks.put((task_id, images))
+        return future
+
+    def _to_ring(self, image):
+        # Paths and FrameRefs are already cheap to send; frames too large
+        # for a slot fall back to being pickled through the queue
+        if self.ring is None or isinstance(image, (str, FrameRef)) or not self.ring.fits(image):
+            return image
+        with self.ring_lock:
+            return self.ring.write(image)
+
+    def detect_batch(self, images):
+        return self.submit(images).result()
+
+    def close(self):
+        self.closing = True
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._fail_all(RuntimeError("Worker pool closed"))
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -1,12 +1,19 @@
-from ultralytics import YOLO
-import cv2
-import numpy as np
 from pathlib import Path
+import base64
 import logging
-import torch
 import json
 import sys
-from function.helper import PlateLocation
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import function.metrics as metrics
+from function.batching import MicroBatcher
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH, WARMUP_RUNS, get_model
+
+# cv2, torch, ultralytics and function.helper are imported where they are
+# used so argument validation, --health and --version start instantly
+
+__version__ = '0.0.1'
 
 # Configure logging
 logging.basicConfig(
@@ -14,121 +21,448 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+def select_device(backend):
+    # Only the PyTorch backend needs torch; onnxruntime runs on CPU here
+    if backend != 'torch':
+        return 'cpu'
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
 class LicensePlateDetector:
-    def __init__(self):
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    def __init__(self, backend='torch', detector_path=DETECTOR_PATH, recognizer_path=RECOGNIZER_PATH,
+                 warmup=WARMUP_RUNS, tile_size=0, tile_overlap=0.2):
+        self.device = select_device(backend)
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
         try:
-            self.detector = YOLO('model/LP_detector_nano_61.pt')
-            self.recognizer = YOLO('model/LP_ocr_nano_62.pt')
-            logging.info("Models loaded successfully")
+            # Instances are shared through the model registry, so several
+            # detectors in one process reuse the same loaded models
+            self.detector = get_model(detector_path, backend, warmup)
+            self.recognizer = get_model(recognizer_path, backend, warmup)
+            logging.info(f"Models loaded successfully ({backend} backend)")
         except Exception as e:
             logging.error(f"Error loading models: {str(e)}")
             raise
 
-    def detect_license_plate(self, image_path):
-        try:
-            # Read image
-            if isinstance(image_path, str):
-                img = cv2.imread(image_path)
-            else:
-                img = image_path
-            
-            if img is None:
-                raise ValueError("Could not read image")
+    def _load_image(self, image):
+        import cv2
 
-            # Detect license plate
-            detect_results = self.detector.predict(
-                source=img,
-                conf=0.25,
-                iou=0.45,
-                device=self.device
-            )[0]
+        # Accept either a file path or an already decoded BGR image
+        img = cv2.imread(image) if isinstance(image, str) else image
+        if img is None:
+            logging.error(f"Could not read image: {image}")
+        return img
 
-            if len(detect_results.boxes) == 0:
-                return None, None, None
+    def _recognize_crops(self, crops):
+        """Read characters from every crop in one batched OCR pass.
 
-            # Get highest confidence box
-            boxes = detect_results.boxes
-            best_box = boxes[0]
-            x1, y1, x2, y2 = map(int, best_box.xyxy[0])
-            confidence = float(best_box.conf[0])
+        Returns a (plate_number, char_confidences) tuple per crop.
+        """
+        from function.helper import extract_chars
 
-            # Crop license plate region
-            plate_region = img[y1:y2, x1:x2]
+        if not crops:
+            return []
 
-            # Recognize characters
+        with metrics.timed('lp_ocr_forward_seconds'):
             char_results = self.recognizer.predict(
-                source=plate_region,
+                source=crops,
                 conf=0.25,
                 iou=0.45,
                 max_det=20,
-                device=self.device
-            )[0]
-
-            if len(char_results.boxes) == 0:
-                return plate_region, None, None
-
-            # Process character recognition results
-            chars = []
-            for i in range(len(char_results.boxes)):
-                cls = int(char_results.boxes.cls[i].item())
-                conf = float(char_results.boxes.conf[i].item())
-                x1 = float(char_results.boxes.xyxy[i][0].item())
-                chars.append((x1, cls, conf))
-
-            # Sort characters left to right
-            chars.sort(key=lambda x: x[0])
-            
-            # Get class names from model
-            names = self.recognizer.names
-            plate_number = ''.join([names[c[1]] for c in chars])
-
-            # Parse plate information
-            plate_info = PlateLocation.parse_plate_info(plate_number)
-
-            # Calculate average confidence
-            avg_confidence = (confidence + sum(c[2] for c in chars) / len(chars)) / 2
-
-            # Create detection result
-            result = {
-                'plateNumber': plate_number,
-                'confidence': avg_confidence,
-                'province': plate_info['province'],
-                'vehicleType': plate_info['type'],
-                'bbox': {
-                    'x': x1,
-                    'y': y1,
-                    'width': x2 - x1,
-                    'height': y2 - y1
-                }
+                device=self.device,
+                verbose=False
+            )
+
+        names = self.recognizer.names
+        readings = [extract_chars(char_result.boxes, names) for char_result in char_results]
+        return readings
+
+    def _build_result(self, bbox, confidence, plate_number, char_confs):
+        from function.helper import PlateLocation
+
+        x1, y1, x2, y2 = bbox
+
+        # Parse plate information
+        plate_info = PlateLocation.parse_plate_info(plate_number)
+
+        # Calculate average confidence; unread plates only have the detector's
+        if char_confs:
+            avg_confidence = (confidence + sum(char_confs) / len(char_confs)) / 2
+        else:
+            avg_confidence = confidence
+
+        return {
+            'plateNumber': plate_number or None,
+            'confidence': avg_confidence,
+            'province': plate_info['province'],
+            'vehicleType': plate_info['type'],
+            'bbox': {
+                'x': x1,
+                'y': y1,
+                'width': x2 - x1,
+                'height': y2 - y1
             }
+        }
+
+    def _detect_boxes(self, sources, tile_size, overlap):
+        """Run the detector once over all sources; returns an (N, 6) box array per source.
+
+        With tile_size, sources larger than one tile are also split into
+        overlapping tiles. The tiles of every source go through the same
+        forward pass as the whole sources, so small far-away plates are seen
+        at native resolution. Boxes cut by an inner tile edge are dropped and
+        duplicates of the same plate are merged.
+        """
+        import numpy as np
+        from function.helper import boxes_to_numpy, drop_cut_boxes, merge_tile_boxes, tile_grid
+
+        batch = []
+        origins = []
+        for index, source in enumerate(sources):
+            batch.append(source)
+            origins.append((index, 0, 0))
+            h, w = source.shape[:2]
+            if tile_size and max(h, w) > tile_size:
+                for x, y in tile_grid(w, h, tile_size, overlap):
+                    batch.append(source[y:y + tile_size, x:x + tile_size])
+                    origins.append((index, x, y))
+        metrics.inc('lp_tiles_total', len(batch) - len(sources))
+
+        with metrics.timed('lp_detector_forward_seconds'):
+            detect_results = self.detector.predict(
+                source=batch,
+                conf=0.25,
+                iou=0.45,
+                device=self.device,
+                verbose=False
+            )
+
+        parts = [[] for _ in sources]
+        for (index, x, y), tile, detect_result in zip(origins, batch, detect_results):
+            boxes = boxes_to_numpy(detect_result.boxes)
+            if tile is not sources[index]:
+                boxes[:, [0, 2]] += x
+                boxes[:, [1, 3]] += y
+                h, w = sources[index].shape[:2]
+                boxes = drop_cut_boxes(boxes, x, y, tile.shape[1], tile.shape[0], w, h)
+            parts[index].append(boxes)
+        return [found[0] if len(found) == 1 else merge_tile_boxes(np.concatenate(found))
+                for found in parts]
+
+    def detect_batch(self, images, rois=None, tile_size=None, tile_overlap=None):
+        """Detect and read plates for a list of images.
+
+        The detector runs once over the whole list and the recognizer runs
+        once over all resulting crops. Returns a (plate_region, result) tuple
+        per input image, in order; unreadable images yield (None, None).
+
+        The result describes the most confident readable plate and lists
+        every detected plate in the image under 'plates'; plates the
+        recognizer could not read have 'plateNumber' None. If no plate is
+        readable the result describes the most confident detection.
+
+        rois optionally gives a RegionOfInterest (or None) per image; the
+        detector then only sees that region and boxes are reported in full
+        image coordinates. tile_size and tile_overlap override the
+        detector's tiling settings (0 disables tiling).
+        """
+        tile_size = self.tile_size if tile_size is None else tile_size
+        tile_overlap = self.tile_overlap if tile_overlap is None else tile_overlap
+
+        outputs = [(None, None)] * len(images)
+        loaded = [(idx, self._load_image(image)) for idx, image in enumerate(images)]
+        loaded = [(idx, img) for idx, img in loaded if img is not None]
+        if not loaded:
+            return outputs
+
+        rois = rois or [None] * len(images)
+        sources = [img if rois[idx] is None else rois[idx].crop(img) for idx, img in loaded]
+
+        # Detect license plates for all images in one forward pass
+        metrics.inc('lp_images_total', len(loaded))
+        detected = self._detect_boxes(sources, tile_size, tile_overlap)
+
+        # Crop every detected plate; boxes come sorted by confidence
+        crops = []
+        owners = []
+        for (idx, img), boxes in zip(loaded, detected):
+            if rois[idx] is not None:
+                boxes = rois[idx].to_frame(boxes)
+            for x1, y1, x2, y2, conf, _ in boxes:
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                if x2 <= x1 or y2 <= y1:
+                    continue
+                crops.append(img[y1:y2, x1:x2])
+                owners.append((idx, (x1, y1, x2, y2), float(conf)))
+
+        metrics.inc('lp_plates_detected_total', len(crops))
 
-            return plate_region, result
+        # Recognize characters of all crops in one forward pass
+        readings = self._recognize_crops(crops)
+
+        plates = {}
+        for plate_region, (idx, bbox, confidence), (plate_number, char_confs) in zip(crops, owners, readings):
+            if outputs[idx][0] is None:
+                outputs[idx] = (plate_region, None)
+            plates.setdefault(idx, []).append(
+                (plate_region, self._build_result(bbox, confidence, plate_number, char_confs))
+            )
+
+        for idx, found in plates.items():
+            readable = [(region, result) for region, result in found if result['plateNumber']]
+            plate_region, best = (readable or found)[0]
+            outputs[idx] = (plate_region, dict(best, plates=[result for _, result in found]))
+
+        return outputs
+
+    def detect_license_plate(self, image_path):
+        try:
+            return self.detect_batch([image_path])[0]
 
         except Exception as e:
             logging.error(f"Error in detection: {str(e)}")
             return None, None
 
+    def detect_tiled(self, image, tile_size=640, overlap=0.2):
+        """detect_license_plate for high-resolution frames such as 4K.
+
+        The frame is split into overlapping tile_size tiles that are batched
+        through the detector in one call, so distant plates are not shrunk
+        away by the letterbox resize.
+        """
+        try:
+            return self.detect_batch([image], tile_size=tile_size, tile_overlap=overlap)[0]
+
+        except Exception as e:
+            logging.error(f"Error in tiled detection: {str(e)}")
+            return None, None
+
+def decode_image(data):
+    """Decode encoded image bytes (JPEG, PNG, ...) into a BGR image, or None"""
+    import cv2
+    import numpy as np
+
+    if not data:
+        return None
+    with metrics.timed('lp_decode_seconds'):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def to_response(result):
+    if result is None:
+        return {'error': 'No license plate detected'}
+    return result
+
+def run_detection(detector, image_path):
+    """Run detection on one image and return the JSON-serializable response."""
+    if not Path(image_path).exists():
+        return {'error': 'Image file not found'}
+
+    _, result = detector.detect_license_plate(image_path)
+    return to_response(result)
+
+def parse_request(line):
+    """Return a request line as a dict.
+
+    A line is either a bare path, {"id": ..., "path": ...} or
+    {"id": ..., "image_b64": ...} carrying the encoded image itself. The
+    fields are validated by the caller, so the id is known even when they
+    are missing.
+    """
+    if line.startswith('{'):
+        return json.loads(line)
+    return {'path': line}
+
+def load_request_image(image_b64):
+    return decode_image(base64.b64decode(image_b64, validate=True))
+
+async def handle_request(batcher, line):
+    request_id = None
+    metrics.inc('lp_requests_total')
+    try:
+        with metrics.timed('lp_request_seconds'):
+            request = parse_request(line)
+            request_id = request.get('id')
+            image_path = request.get('path')
+            image_b64 = request.get('image_b64')
+            if image_b64:
+                # Decode off the event loop; the frame never touches the disk
+                image = await asyncio.get_running_loop().run_in_executor(None, load_request_image, image_b64)
+                if image is None:
+                    response = {'error': 'Could not decode image'}
+                else:
+                    _, result = await batcher.submit(image)
+                    response = to_response(result)
+            elif not image_path:
+                response = {'error': 'Request needs a path or image_b64'}
+            elif not Path(image_path).exists():
+                response = {'error': 'Image file not found'}
+            else:
+                _, result = await batcher.submit(image_path)
+                response = to_response(result)
+    except Exception as e:
+        logging.error(f"Error handling request: {str(e)}")
+        response = {'error': str(e)}
+
+    if 'error' in response:
+        metrics.inc('lp_request_errors_total')
+    if request_id is not None:
+        response = dict(response, id=request_id)
+    print(json.dumps(response), flush=True)
+
+async def serve_async(detector, max_batch, max_wait_ms, concurrency):
+    loop = asyncio.get_running_loop()
+
+    # Inference runs on dedicated threads (one per pool worker); requests that
+    # arrive while they are busy are micro-batched into the next detect_batch call
+    batcher = MicroBatcher(detector.detect_batch, max_batch, max_wait_ms,
+                           ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='inference'),
+                           concurrency)
+    batcher.start()
+    print(json.dumps({'ready': True}), flush=True)
+
+    pending = set()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        task = asyncio.create_task(handle_request(batcher, line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+    await batcher.close()
+
+def serve(detector, max_batch=8, max_wait_ms=5.0, concurrency=1):
+    """Resident worker loop: one JSON request per stdin line, one JSON response per stdout line.
+
+    A request is either a bare image path, an object {"id": ..., "path": ...}
+    or an object {"id": ..., "image_b64": ...} with the base64-encoded image
+    file contents; the id is echoed back so callers can match responses to requests, which
+    may be answered out of order. Concurrent requests are grouped into
+    batches of up to max_batch images, waiting at most max_wait_ms.
+
+    detector may also be a WorkerPool, with concurrency set to its size.
+    """
+    asyncio.run(serve_async(detector, max_batch, max_wait_ms, concurrency))
+
+def health(args):
+    """Cheap readiness probe: checks the model files without loading any model"""
+    models = {
+        'detector': args.detector_model,
+        'recognizer': args.ocr_model
+    }
+    missing = [name for name, path in models.items() if not Path(path).exists()]
+    return {
+        'status': 'error' if missing else 'ok',
+        'version': __version__,
+        'backend': args.backend,
+        'models': models,
+        'missing': missing
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Detect and read the license plate in an image')
+    parser.add_argument('image', nargs='?',
+                        help="path of the image to process, or '-' to read the encoded image from stdin")
+    parser.add_argument('--version', action='store_true', help='print the version and exit')
+    parser.add_argument('--health', action='store_true',
+                        help='check that the model files are present without loading them')
+    parser.add_argument('--serve', action='store_true',
+                        help='keep the models loaded and answer JSON requests on stdin')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                        help='inference backend; onnx exports and caches .onnx files next to the .pt models')
+    parser.add_argument('--tile-size', type=int, default=0,
+                        help='also detect on overlapping tiles of this size for images larger than it '
+                             '(e.g. 640 for 4K frames); 0 disables tiling')
+    parser.add_argument('--max-batch', type=int, default=8,
+                        help='with --serve, most images run through the models in one batch')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='with --serve, how long to wait for more requests before running a batch')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='with --serve, run N detector processes instead of detecting in-process')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='torch/onnxruntime threads per worker (default: CPUs divided by workers)')
+    parser.add_argument('--pin-cpus', action='store_true',
+                        help='pin each worker to its own slice of CPUs')
+    parser.add_argument('--shm-slots', type=int, default=0,
+                        help='with --workers, pass decoded images to workers through a shared-memory '
+                             'ring of N frames; raised to workers * max-batch if smaller')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='with --serve, expose Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--detector-model', default=DETECTOR_PATH,
+                        help='plate detector weights (.pt, or .onnx such as an INT8 export)')
+    parser.add_argument('--ocr-model', default=RECOGNIZER_PATH,
+                        help='character recognizer weights (.pt, or .onnx such as an INT8 export)')
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) != 2:
+    args = parse_args()
+
+    if args.version:
+        print(json.dumps({'version': __version__}))
+        sys.exit(0)
+
+    if args.health:
+        status = health(args)
+        print(json.dumps(status))
+        sys.exit(0 if status['status'] == 'ok' else 1)
+
+    if args.serve:
+        if args.metrics_port is not None:
+            metrics.start_http_server(args.metrics_port)
+        try:
+            if args.workers > 0:
+                from function.worker_pool import WorkerPool
+
+                # Every frame in flight needs its own slot, or it is overwritten
+                # before a worker reads it: at most workers batches of max_batch
+                in_flight = args.workers * args.max_batch
+                if 0 < args.shm_slots < in_flight:
+                    logging.warning(f"--shm-slots {args.shm_slots} is below workers * max-batch; using {in_flight}")
+                    args.shm_slots = in_flight
+                detector = WorkerPool(args.workers, args.threads_per_worker, args.pin_cpus,
+                                      args.backend, args.detector_model, args.ocr_model,
+                                      ring_slots=args.shm_slots, tile_size=args.tile_size).start()
+            else:
+                detector = LicensePlateDetector(args.backend, args.detector_model, args.ocr_model,
+                                                tile_size=args.tile_size)
+        except Exception as e:
+            print(json.dumps({'error': str(e)}), flush=True)
+            sys.exit(1)
+        serve(detector, args.max_batch, args.max_wait_ms, max(1, args.workers))
+        if args.workers > 0:
+            detector.close()
+        sys.exit(0)
+
+    if args.image is None:
         print(json.dumps({'error': 'Image path argument required'}))
         sys.exit(1)
 
-    image_path = sys.argv[1]
-    if not Path(image_path).exists():
+    image_path = args.image
+    image = None
+    if image_path == '-':
+        image = decode_image(sys.stdin.buffer.read())
+        if image is None:
+            print(json.dumps({'error': 'Could not decode image'}))
+            sys.exit(1)
+    elif not Path(image_path).exists():
         print(json.dumps({'error': 'Image file not found'}))
         sys.exit(1)
 
     try:
-        detector = LicensePlateDetector()
-        _, result = detector.detect_license_plate(image_path)
-        
-        if result is None:
-            print(json.dumps({'error': 'No license plate detected'}))
-            sys.exit(1)
-
-        print(json.dumps(result))
-        sys.exit(0)
+        detector = LicensePlateDetector(args.backend, args.detector_model, args.ocr_model,
+                                        tile_size=args.tile_size)
+        if image is not None:
+            _, result = detector.detect_license_plate(image)
+            response = to_response(result)
+        else:
+            response = run_detection(detector, image_path)
+        print(json.dumps(response))
+        sys.exit(1 if 'error' in response else 0)
 
     except Exception as e:
         print(json.dumps({'error': str(e)}))
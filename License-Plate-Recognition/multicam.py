@@ -0,0 +1,195 @@
+import argparse
+import json
+import logging
+import sys
+import time
+import function.metrics as metrics
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH
+from function.motion import MotionGate
+from function.roi import RegionOfInterest
+from function.streams import LatestFrameStream, open_sinks, round_robin
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def load_config(path):
+    """Read the camera list: {"cameras": [{"name", "source", "sink"?}, ...]}.
+
+    sink is a JSON-lines file per camera, or '-' (the default) for stdout;
+    "motion": false exempts a camera from --motion gating, and "roi" limits
+    detection to a polygon given as [[x, y], ...] pixel points.
+    """
+    with open(path) as f:
+        config = json.load(f)
+
+    cameras = config.get('cameras', [])
+    if not cameras:
+        raise ValueError(f"No cameras configured in {path}")
+    names = set()
+    for camera in cameras:
+        if 'name' not in camera or 'source' not in camera:
+            raise ValueError(f"Camera entries need a name and a source: {camera}")
+        if camera['name'] in names:
+            raise ValueError(f"Duplicate camera name {camera['name']}")
+        names.add(camera['name'])
+        camera.setdefault('sink', '-')
+    return config
+
+def _moving(pick, gates, rois):
+    # Only motion inside the camera's region of interest counts
+    stream, _, frame = pick
+    roi = rois.get(stream.name)
+    return gates[stream.name].should_detect(frame if roi is None else roi.crop(frame))
+
+def _select(picks, gates, rois, streams):
+    """Keep the picks worth detecting on; cameras whose ROI does not fit their frames are dropped"""
+    selected = []
+    for pick in picks:
+        stream, _, frame = pick
+        try:
+            if stream.name in rois:
+                rois[stream.name].validate(frame.shape)
+            if stream.name in gates and not _moving(pick, gates, rois):
+                metrics.inc('lp_motion_skipped_total')
+                continue
+        except ValueError as e:
+            logging.error(f"[{stream.name}] {str(e)}; dropping camera")
+            stream.stop()
+            streams.remove(stream)
+            continue
+        except Exception as e:
+            logging.error(f"[{stream.name}] Error preparing frame: {str(e)}")
+            continue
+        selected.append(pick)
+    return selected
+
+def _detect(detector, picks, rois):
+    """detect_batch over the picks; if the batch fails, retry frame by frame so one bad camera costs only its frame"""
+    frames = [frame for _, _, frame in picks]
+    regions = [rois.get(stream.name) for stream, _, _ in picks]
+    try:
+        return detector.detect_batch(frames, regions)
+    except Exception as e:
+        logging.error(f"Error processing batch: {str(e)}")
+
+    outputs = []
+    for (stream, _, _), frame, roi in zip(picks, frames, regions):
+        try:
+            outputs.append(detector.detect_batch([frame], [roi])[0])
+        except Exception as e:
+            logging.error(f"[{stream.name}] Error processing frame: {str(e)}")
+            metrics.inc('lp_frame_errors_total')
+            outputs.append((None, None))
+    return outputs
+
+def run(detector, streams, sinks, max_batch=8, idle_ms=5.0, gates=None, rois=None):
+    """Batch the newest frame of each camera through one detector until all streams end.
+
+    sinks maps camera name to the sink that receives its results; gates
+    optionally maps camera name to a MotionGate that drops unchanged frames,
+    and rois to the RegionOfInterest the camera's detection is limited to.
+    Errors are handled per camera, so one failing camera never stops the others.
+    """
+    gates = gates or {}
+    rois = rois or {}
+    streams = list(streams)
+    start = 0
+    while streams and not all(stream.finished for stream in streams):
+        picks, start = round_robin(streams, start, max_batch)
+        picks = _select(picks, gates, rois, streams)
+        start = start % len(streams) if streams else 0
+        if not picks:
+            time.sleep(idle_ms / 1000.0)
+            continue
+
+        metrics.observe('lp_batch_size', len(picks), metrics.COUNT_BUCKETS)
+        with metrics.timed('lp_multicam_batch_seconds'):
+            outputs = _detect(detector, picks, rois)
+
+        timestamp = time.time()
+        for (stream, seq, _), (_, result) in zip(picks, outputs):
+            metrics.inc('lp_frames_processed_total')
+            if result is None:
+                continue
+            try:
+                sinks[stream.name].write({
+                    'camera': stream.name,
+                    'frame': seq,
+                    'timestamp': timestamp,
+                    'plates': result['plates']
+                })
+            except Exception as e:
+                logging.error(f"[{stream.name}] Error writing result: {str(e)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='License plate recognition across many camera streams')
+    parser.add_argument('config', help='JSON file listing the cameras')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                        help='inference backend; onnx exports and caches .onnx files next to the .pt models')
+    parser.add_argument('--detector-model', default=DETECTOR_PATH, help='plate detector weights')
+    parser.add_argument('--ocr-model', default=RECOGNIZER_PATH, help='character recognizer weights')
+    parser.add_argument('--max-batch', type=int, default=8, help='most camera frames per detector batch')
+    parser.add_argument('--tile-size', type=int, default=0,
+                        help='also detect on overlapping tiles of this size, for high-resolution cameras')
+    parser.add_argument('--idle-ms', type=float, default=5.0,
+                        help='how long to sleep when no camera has a new frame')
+    parser.add_argument('--motion', action='store_true',
+                        help='only run detection on a camera when its scene changes')
+    parser.add_argument('--motion-threshold', type=float, default=0.01,
+                        help='with --motion, fraction of pixels that must change to trigger detection')
+    parser.add_argument('--motion-refresh', type=int, default=30,
+                        help='with --motion, detect at least every N frames per camera even without motion')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='expose Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.metrics_port is not None:
+        metrics.start_http_server(args.metrics_port)
+
+    streams = []
+    sinks = {}
+    try:
+        config = load_config(args.config)
+
+        # One detector for every camera: memory grows with models, not cameras
+        from lp_image import LicensePlateDetector
+        detector = LicensePlateDetector(args.backend, args.detector_model, args.ocr_model,
+                                        tile_size=args.tile_size)
+
+        cameras = config['cameras']
+        sinks = open_sinks(camera['sink'] for camera in cameras)
+        routes = {camera['name']: sinks[camera['sink']] for camera in cameras}
+        streams = [LatestFrameStream(camera['name'], camera['source']).start() for camera in cameras]
+        logging.info(f"Processing {len(streams)} cameras")
+
+        gates = {}
+        if args.motion:
+            gates = {camera['name']: MotionGate(args.motion_threshold, refresh_every=args.motion_refresh)
+                     for camera in cameras if camera.get('motion', True)}
+
+        rois = {camera['name']: RegionOfInterest(camera['roi']) for camera in cameras if camera.get('roi')}
+
+        run(detector, streams, routes, args.max_batch, args.idle_ms, gates, rois)
+
+    except KeyboardInterrupt:
+        pass
+
+    except Exception as e:
+        logging.error(f"Program error: {str(e)}")
+        return 1
+
+    finally:
+        for stream in streams:
+            stream.stop()
+        for sink in sinks.values():
+            sink.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
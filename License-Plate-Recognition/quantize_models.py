@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from function.onnx_backend import export_onnx, letterbox
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH
+from function.tracker import iou
+from lp_image import LicensePlateDetector
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+def int8_path_for(onnx_path):
+    return os.path.splitext(onnx_path)[0] + '.int8.onnx'
+
+def load_plate_boxes(label_path, width, height):
+    """Read labels_backup quadrilaterals as pixel (x1, y1, x2, y2) boxes"""
+    boxes = []
+    with open(label_path, 'r') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) != 9:
+                continue
+            coords = [float(x) for x in parts[1:]]
+            xs = [x * width for x in coords[0::2]]
+            ys = [y * height for y in coords[1::2]]
+            boxes.append((min(xs), min(ys), max(xs), max(ys)))
+    return boxes
+
+def find_labeled_images(image_roots, labels_dir):
+    """Pair images under image_roots with their labels_backup label files by file stem"""
+    labels = {p.stem: p for p in Path(labels_dir).rglob('*.txt')}
+    samples = []
+    for root in image_roots:
+        if not Path(root).exists():
+            continue
+        for image_path in sorted(Path(root).rglob('*')):
+            if image_path.suffix.lower() in IMAGE_SUFFIXES and image_path.stem in labels:
+                samples.append((str(image_path), str(labels[image_path.stem])))
+    return samples
+
+def split_samples(samples, calibration_size):
+    # Calibrate on every other image and evaluate on the rest so the sets never overlap
+    calibration = samples[0::2][:calibration_size]
+    evaluation = samples[1::2]
+    return calibration, evaluation
+
+class ImageCalibrationReader:
+    """onnxruntime CalibrationDataReader feeding letterboxed images one at a time"""
+
+    def __init__(self, images, input_name, imgsz=640):
+        self.images = iter(images)
+        self.input_name = input_name
+        self.imgsz = imgsz
+
+    def get_next(self):
+        img = next(self.images, None)
+        if img is None:
+            return None
+        padded, _, _ = letterbox(img, self.imgsz)
+        batch = padded[:, :, ::-1].transpose(2, 0, 1)[None]
+        return {self.input_name: np.ascontiguousarray(batch, dtype=np.float32) / 255.0}
+
+def quantize_model(onnx_path, images):
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    output_path = int8_path_for(onnx_path)
+    prepared_path = os.path.splitext(onnx_path)[0] + '.prep.onnx'
+    quant_pre_process(onnx_path, prepared_path)
+
+    input_name = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    logging.info(f"Calibrating {onnx_path} on {len(images)} images...")
+    quantize_static(
+        prepared_path,
+        output_path,
+        ImageCalibrationReader(images, input_name),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    os.remove(prepared_path)
+
+    # Keep the ultralytics metadata (class names, stride) so OnnxYOLO can read it
+    original = onnx.load(onnx_path)
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(original.metadata_props)
+    onnx.save(quantized, output_path)
+
+    logging.info(f"Saved INT8 model to {output_path}")
+    return output_path
+
+def evaluate(detector, samples, reference=None):
+    """Measure plate recall against the labels, OCR agreement with a reference run, and latency"""
+    latencies = []
+    matched = 0
+    total = 0
+    readings = {}
+    agree = 0
+    compared = 0
+
+    for image_path, label_path in samples:
+        img = cv2.imread(image_path)
+        if img is None:
+            continue
+
+        start = time.perf_counter()
+        _, result = detector.detect_license_plate(img)
+        latencies.append(time.perf_counter() - start)
+
+        plates = result['plates'] if result else []
+        found = [(p['bbox']['x'], p['bbox']['y'],
+                  p['bbox']['x'] + p['bbox']['width'], p['bbox']['y'] + p['bbox']['height'])
+                 for p in plates]
+        for box in load_plate_boxes(label_path, img.shape[1], img.shape[0]):
+            total += 1
+            if any(iou(box, f) >= 0.5 for f in found):
+                matched += 1
+
+        readings[image_path] = result['plateNumber'] if result else None
+        if reference is not None and reference.get(image_path) is not None:
+            compared += 1
+            agree += readings[image_path] == reference[image_path]
+
+    latencies = np.array(latencies) * 1000
+    report = {
+        'images': len(latencies),
+        'plate_recall': matched / total if total else None,
+        'latency_ms_mean': float(latencies.mean()) if len(latencies) else None,
+        'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+    }
+    if reference is not None:
+        report['plate_text_agreement'] = agree / compared if compared else None
+    return report, readings
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Quantize the detector and OCR models to INT8 and report accuracy/speed')
+    parser.add_argument('--images', nargs='+', default=['images', 'datasets'],
+                        help='directories searched for images that have labels in --labels')
+    parser.add_argument('--labels', default='labels_backup', help='plate label directory')
+    parser.add_argument('--calibration-size', type=int, default=200, help='maximum number of calibration images')
+    parser.add_argument('--report', default='quantization_report.json', help='where to write the JSON report')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    samples = find_labeled_images(args.images, args.labels)
+    if len(samples) < 2:
+        logging.error(f"Need labeled images under {args.images} matching {args.labels}")
+        return 1
+    calibration, evaluation = split_samples(samples, args.calibration_size)
+    logging.info(f"{len(calibration)} calibration images, {len(evaluation)} evaluation images")
+
+    # Detector calibrates on full frames, OCR on the labeled plate crops
+    frames = []
+    crops = []
+    for image_path, label_path in calibration:
+        img = cv2.imread(image_path)
+        if img is None:
+            continue
+        frames.append(img)
+        for x1, y1, x2, y2 in load_plate_boxes(label_path, img.shape[1], img.shape[0]):
+            crop = img[int(y1):int(y2), int(x1):int(x2)]
+            if crop.size:
+                crops.append(crop)
+
+    if not frames or not crops:
+        logging.error(f"No usable calibration data: {len(frames)} readable images, {len(crops)} plate crops")
+        return 1
+
+    detector_fp32 = export_onnx(DETECTOR_PATH)
+    recognizer_fp32 = export_onnx(RECOGNIZER_PATH)
+    detector_int8 = quantize_model(detector_fp32, frames)
+    recognizer_int8 = quantize_model(recognizer_fp32, crops)
+
+    # The FP32 ONNX exports are the baseline: same runtime and pre/post
+    # processing as the INT8 models, so differences come from quantization
+    # alone. PyTorch is reported alongside for reference.
+    fp32_report, fp32_readings = evaluate(
+        LicensePlateDetector(detector_path=detector_fp32, recognizer_path=recognizer_fp32), evaluation)
+    int8_report, _ = evaluate(
+        LicensePlateDetector(detector_path=detector_int8, recognizer_path=recognizer_int8), evaluation,
+        reference=fp32_readings)
+    pytorch_report, _ = evaluate(LicensePlateDetector(), evaluation, reference=fp32_readings)
+
+    report = {
+        'models': {
+            'pytorch': {'detector': DETECTOR_PATH, 'recognizer': RECOGNIZER_PATH},
+            'fp32': {'detector': detector_fp32, 'recognizer': recognizer_fp32},
+            'int8': {'detector': detector_int8, 'recognizer': recognizer_int8}
+        },
+        'pytorch': pytorch_report,
+        'fp32': fp32_report,
+        'int8': int8_report
+    }
+    if fp32_report['latency_ms_mean'] and int8_report['latency_ms_mean']:
+        report['speedup'] = fp32_report['latency_ms_mean'] / int8_report['latency_ms_mean']
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name in ('pytorch', 'fp32', 'int8'):
+        r = report[name]
+        if r['images']:
+            logging.info(f"{name}: recall={r['plate_recall']} p50={r['latency_ms_p50']:.1f}ms "
+                         f"p95={r['latency_ms_p95']:.1f}ms")
+    logging.info(f"INT8 plate text agreement with FP32 ONNX: {int8_report['plate_text_agreement']}")
+    logging.info(f"PyTorch plate text agreement with FP32 ONNX: {pytorch_report['plate_text_agreement']}")
+    logging.info(f"Report written to {args.report}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,8 @@
-from ultralytics import YOLO
 import cv2
 import logging
 import os
 from function.helper import PlateLocation
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH, get_model
 
 # Thiết lập logging chi tiết hơn
 logging.basicConfig(
@@ -20,8 +20,8 @@ def test_detection():
         
         # Kiểm tra models
         model_paths = {
-            'detector': 'model/LP_detector_nano_61.pt',
-            'recognizer': 'model/LP_ocr_nano_62.pt'
+            'detector': DETECTOR_PATH,
+            'recognizer': RECOGNIZER_PATH
         }
         
         for name, path in model_paths.items():
@@ -31,8 +31,8 @@ def test_detection():
             logging.info(f"Đã tìm thấy model {name}")
             
         # Khởi tạo models
-        detector = YOLO('model/LP_detector_nano_61.pt')
-        recognizer = YOLO('model/LP_ocr_nano_62.pt')
+        detector = get_model(DETECTOR_PATH)
+        recognizer = get_model(RECOGNIZER_PATH)
         logging.info("Đã khởi tạo xong models")
 
         # Đọc ảnh test
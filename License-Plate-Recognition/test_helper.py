@@ -0,0 +1,113 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from function.helper import PLATE_PATTERN, drop_cut_boxes, merge_tile_boxes, read_plate_batch, tile_grid
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(message)s'
+)
+
+NAMES = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+         'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J',
+         'K', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'T', 'U',
+         '-', 'plate']
+
+class FakeBoxes:
+    def __init__(self, plate, conf):
+        # One character box per character, left to right
+        self.data = np.array([[i * 10, 0, i * 10 + 8, 20, conf, NAMES.index(ch)]
+                              for i, ch in enumerate(plate)], dtype=np.float32).reshape(-1, 6)
+
+class FakeResult:
+    def __init__(self, plate, conf):
+        self.boxes = FakeBoxes(plate, conf)
+
+class FakeOcrModel:
+    """Returns one canned reading per candidate image"""
+    names = NAMES
+
+    def __init__(self, readings):
+        self.readings = readings
+
+    def predict(self, source, **kwargs):
+        return [FakeResult(plate, conf) for plate, conf in self.readings[:len(source)]]
+
+def read(readings):
+    candidates = [np.zeros((20, 80, 3), dtype=np.uint8)] * len(readings)
+    plate, _ = read_plate_batch(FakeOcrModel(readings), candidates)
+    return plate
+
+def test_plate_pattern():
+    for plate in ["51F-12345", "29B1-99999", "51F12345", "51F-123.45", "99C-1234"]:
+        assert PLATE_PATTERN.match(plate), plate
+    for plate in ["51F-", "F51-12345", "51F--12345", "51F-123456"]:
+        assert not PLATE_PATTERN.match(plate), plate
+    print("Plate pattern: hyphenated and dotted plates accepted")
+
+def test_full_read_beats_truncated_read():
+    plate = read([("51F1234", 0.5), ("51F-12345", 0.9)])
+    print(f"Full vs truncated read: {plate}")
+    assert plate == "51F-12345"
+
+def test_valid_read_beats_confident_garbage():
+    plate = read([("1F-1234599", 0.95), ("29B1-99999", 0.6)])
+    print(f"Valid vs invalid read: {plate}")
+    assert plate == "29B1-99999"
+
+def test_tile_grid_covers_image():
+    tiles = tile_grid(1920, 1080, 640, 0.2)
+    xs = sorted({x for x, _ in tiles})
+    ys = sorted({y for _, y in tiles})
+    print(f"Tile grid: x={xs} y={ys}")
+    assert xs[0] == 0 and xs[-1] == 1920 - 640
+    assert ys[0] == 0 and ys[-1] == 1080 - 640
+    # Neighbouring tiles overlap, so no plate narrower than the overlap is cut in all of them
+    assert all(b - a <= 640 - 128 for a, b in zip(xs, xs[1:]))
+    assert all(b - a <= 640 - 128 for a, b in zip(ys, ys[1:]))
+    assert tile_grid(500, 400, 640) == [(0, 0)]
+
+def test_drop_cut_boxes():
+    # Tile at (512, 0) in a 1920x1080 frame: its left and bottom edges are inside the image
+    boxes = np.array([
+        [514, 100, 600, 130, 0.9, 0],   # touches the left edge
+        [700, 100, 800, 130, 0.9, 0],   # well inside
+        [700, 630, 800, 639, 0.9, 0],   # ends a few pixels short of the bottom edge
+        [700, 0, 800, 30, 0.9, 0],      # on the top edge, which is the image border
+    ], dtype=np.float32)
+    kept = drop_cut_boxes(boxes, 512, 0, 640, 640, 1920, 1080)
+    print(f"Cut boxes: kept {kept[:, :4].tolist()}")
+    assert kept[:, :4].tolist() == [[700, 100, 800, 130], [700, 0, 800, 30]]
+
+def test_merge_keeps_whole_plate_over_confident_fragment():
+    boxes = np.array([[0, 0, 100, 30, 0.7, 0], [50, 0, 100, 30, 0.9, 0]], dtype=np.float32)
+    merged = merge_tile_boxes(boxes)
+    print(f"Fragment merge: {merged.tolist()}")
+    assert len(merged) == 1
+    assert merged[0, :4].tolist() == [0, 0, 100, 30]
+    assert abs(merged[0, 4] - 0.9) < 1e-6
+
+def test_merge_keeps_separate_plates():
+    boxes = np.array([
+        [0, 0, 100, 30, 0.8, 0],
+        [2, 1, 101, 31, 0.9, 0],       # the same plate seen by another tile
+        [300, 0, 400, 30, 0.6, 0],     # another plate
+    ], dtype=np.float32)
+    merged = merge_tile_boxes(boxes)
+    print(f"Separate plates: {len(merged)} boxes")
+    assert len(merged) == 2
+    assert merged[:, 4].tolist() == [np.float32(0.9), np.float32(0.6)]
+
+if __name__ == "__main__":
+    test_plate_pattern()
+    test_full_read_beats_truncated_read()
+    test_valid_read_beats_confident_garbage()
+    test_tile_grid_covers_image()
+    test_drop_cut_boxes()
+    test_merge_keeps_whole_plate_over_confident_fragment()
+    test_merge_keeps_separate_plates()
+    print("Helper checks passed")
@@ -0,0 +1,51 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from function.tracker import PlateTracker
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(message)s'
+)
+
+def run_track(readings):
+    """Feed one stationary plate through the tracker; returns (ocr_calls, finalized_at, track)"""
+    tracker = PlateTracker()
+    box = (100, 100, 220, 140)
+    ocr_calls = 0
+    finalized_at = None
+    track = None
+    for frame, plate in enumerate(readings):
+        track = tracker.update([box])[0]
+        if not tracker.needs_ocr(track):
+            continue
+        ocr_calls += 1
+        confs = [0.95] * len(plate) if plate != "unknown" else []
+        if tracker.record_reading(track, plate, confs):
+            finalized_at = frame
+    return ocr_calls, finalized_at, track
+
+def test_confident_plate_finalizes():
+    ocr_calls, finalized_at, track = run_track(["51F12345"] * 10)
+    print(f"Confident plate: {ocr_calls} OCR calls, finalized at frame {finalized_at}, plate {track.plate}")
+    assert track.finalized and track.plate == "51F12345"
+    assert finalized_at == 2 and ocr_calls == 3
+
+def test_wrong_first_read_is_outvoted():
+    ocr_calls, finalized_at, track = run_track(["51F12845"] + ["51F12345"] * 9)
+    print(f"Wrong first read: {ocr_calls} OCR calls, finalized at frame {finalized_at}, plate {track.plate}")
+    assert track.finalized and track.plate == "51F12345"
+
+def test_unreadable_plate_keeps_reading():
+    ocr_calls, finalized_at, track = run_track(["unknown"] * 5)
+    print(f"Unreadable plate: {ocr_calls} OCR calls, finalized {track.finalized}")
+    assert not track.finalized and ocr_calls == 5
+
+if __name__ == "__main__":
+    test_confident_plate_finalizes()
+    test_wrong_first_read_is_outvoted()
+    test_unreadable_plate_keeps_reading()
+    print("Tracker checks passed")
@@ -1,12 +1,21 @@
 import sys
+import json
 import logging
+import argparse
+import queue
+import threading
 from PIL import Image
 import cv2
-from ultralytics import YOLO
 import function.utils_rotate as utils_rotate
 import os
 import time
 import function.helper as helper
+import function.metrics as metrics
+from function.tracker import PlateTracker
+from function.scheduler import FrameScheduler, usable_fps
+from function.motion import MotionGate
+from function.roi import RegionOfInterest, parse_polygon
+from function.model_registry import DETECTOR_PATH, RECOGNIZER_PATH, get_model
 import numpy as np
 import torch
 
@@ -20,159 +29,407 @@ logging.basicConfig(
     ]
 )
 
-def load_model(model_path):
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model not found: {model_path}")
+def open_camera():
+    # Try different camera indices
+    camera_indices = [1, 0]  # Try external camera first, then built-in
+    vid = None
+    for idx in camera_indices:
+        logging.info(f"Trying camera index {idx}...")
+        vid = cv2.VideoCapture(idx)
+        if vid.isOpened():
+            logging.info(f"Successfully opened camera {idx}")
+            break
+
+    if vid is None or not vid.isOpened():
+        raise Exception("Could not open any camera")
+    return vid
+
+def open_source(source):
+    """Open a camera index, video file or stream URL; None tries the local cameras"""
+    if source is None:
+        return open_camera()
+
+    vid = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not vid.isOpened():
+        raise Exception(f"Could not open video source {source}")
+    logging.info(f"Opened video source {source}")
+    return vid
+
+def detect_plates(frame, yolo_LP_detect, yolo_license_plate, tracker=None, roi=None):
+    """Detect and read every plate in a frame.
+
+    Returns a list of (x, y, w, h, lp) tuples where lp is "unknown" if the
+    plate could not be read. With a tracker, plates already read in earlier
+    frames reuse their reading instead of running OCR again. With a roi, the
+    detector only sees that region of the frame.
+    """
+    # YOLOv8 detection with confidence threshold
+    with metrics.timed('lp_detector_forward_seconds'):
+        results = yolo_LP_detect(frame if roi is None else roi.crop(frame), conf=0.6, verbose=False)
+    list_plates = []
+
+    # Process detection results
+    for r in results:
+        boxes = helper.boxes_to_numpy(r.boxes)
+        if roi is not None:
+            boxes = roi.to_frame(boxes)
+        # Get box coordinates and confidence
+        for b in boxes.tolist():
+            list_plates.append(b[:5])
+            logging.debug(f"Detected plate with confidence: {b[4]:.2f}")
+
+    # Process detected plates
+    regions = []
+    for plate in list_plates:
+        x = max(0, int(plate[0]))
+        y = max(0, int(plate[1]))
+        w = min(int(plate[2] - plate[0]), frame.shape[1] - x)
+        h = min(int(plate[3] - plate[1]), frame.shape[0] - y)
+
+        if w <= 0 or h <= 0:
+            continue
+        regions.append((x, y, w, h))
+    metrics.observe('lp_crops_per_frame', len(regions), metrics.COUNT_BUCKETS)
+
+    tracks = [None] * len(regions)
+    if tracker is not None:
+        tracks = tracker.update([(x, y, x+w, y+h) for x, y, w, h in regions])
+
+    detections = []
+    for (x, y, w, h), track in zip(regions, tracks):
+        try:
+            crop_img = frame[y:y+h, x:x+w]
+
+            if track is not None:
+                if not tracker.needs_ocr(track):
+                    metrics.inc('lp_ocr_skipped_total')
+                    detections.append((x, y, w, h, track.plate))
+                    continue
+
+            # Read all rotation candidates in one batched OCR pass
+            with metrics.timed('lp_deskew_seconds'):
+                candidates = [utils_rotate.deskew(crop_img, cc, ct)
+                              for cc in range(0, 2) for ct in range(0, 2)]
+            metrics.inc('lp_deskew_attempts_total', len(candidates))
+            lp, confs = helper.read_plate_batch(yolo_license_plate, candidates)
+            if lp != "unknown":
+                logging.debug(f"Recognized plate: {lp}")
+
+            if track is not None:
+                if tracker.record_reading(track, lp, confs):
+                    logging.info(f"Plate {track.track_id} finalized: {track.plate}")
+                lp = track.plate
+            detections.append((x, y, w, h, lp))
+        except Exception as e:
+            logging.error(f"Error processing plate: {str(e)}")
+            continue
+
+    return detections
+
+def detect_if_moving(frame, yolo_LP_detect, yolo_license_plate, tracker=None, gate=None, roi=None):
+    """detect_plates, unless the motion gate says the scene is unchanged; then None"""
+    # Only motion inside the region of interest counts
+    if gate is not None and not gate.should_detect(frame if roi is None else roi.crop(frame)):
+        metrics.inc('lp_motion_skipped_total')
+        return None
+    with metrics.timed('lp_frame_seconds'):
+        return detect_plates(frame, yolo_LP_detect, yolo_license_plate, tracker, roi)
+
+def draw_results(frame, detections, fps):
+    list_read_plates = set()
+    for x, y, w, h, lp in detections:
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color=(0, 0, 255), thickness=2)
+        if lp == "unknown":
+            continue
+
+        list_read_plates.add(lp)
+        # Draw text with background
+        text_size = cv2.getTextSize(lp, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
+        cv2.rectangle(frame,
+                    (x, y-text_size[1]-10),
+                    (x+text_size[0], y),
+                    (0, 0, 0),
+                    -1)
+        cv2.putText(frame, lp, (x, y-10),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36, 255, 12), 2)
+
+    # Draw FPS counter with background
+    fps_text = f"FPS: {fps}"
+    cv2.rectangle(frame, (7, 30), (120, 80), (0, 0, 0), -1)
+    cv2.putText(frame, fps_text, (10, 70),
+              cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 0), 2)
+
+    # Display detected plates
+    if list_read_plates:
+        plate_text = " | ".join(list_read_plates)
+        bg_width = cv2.getTextSize(f"Detected: {plate_text}",
+                                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0][0]
+        cv2.rectangle(frame,
+                    (8, frame.shape[0]-40),
+                    (bg_width+12, frame.shape[0]-10),
+                    (0, 0, 0),
+                    -1)
+        cv2.putText(frame, f"Detected: {plate_text}",
+                  (10, frame.shape[0]-20),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+def put_latest(q, item):
+    # Keep only the freshest item: drop the stale one when the consumer is behind
     try:
-        model = YOLO(model_path)
-        return model
-    except Exception as e:
-        logging.error(f"Error loading model {model_path}: {str(e)}")
-        raise
+        q.put_nowait(item)
+    except queue.Full:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(item)
+
+def run_serial(vid, yolo_LP_detect, yolo_license_plate, tracker=None, gate=None, roi=None):
+    prev_frame_time = 0
+    new_frame_time = 0
+    detections = []
+
+    while True:
+        ret, frame = vid.read()
+        if not ret:
+            logging.error("Failed to grab frame")
+            break
+
+        try:
+            # An unchanged scene keeps showing the previous detections
+            result = detect_if_moving(frame, yolo_LP_detect, yolo_license_plate, tracker, gate, roi)
+            if result is not None:
+                detections = result
+
+            # Calculate and display FPS
+            new_frame_time = time.time()
+            fps = int(1/(new_frame_time-prev_frame_time))
+            prev_frame_time = new_frame_time
+
+            draw_results(frame, detections, fps)
+            cv2.imshow('License Plate Detection', frame)
+
+        except Exception as e:
+            logging.error(f"Error processing frame: {str(e)}")
+            continue
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+def run_pipelined(vid, yolo_LP_detect, yolo_license_plate, tracker=None, gate=None, roi=None):
+    """Run capture, inference and rendering as concurrent stages.
+
+    Capture and inference each get a worker thread; rendering stays on the
+    main thread because OpenCV's HighGUI must be driven from there. Stages
+    are joined by single-slot queues so a slow stage always sees the newest
+    frame and stale ones are dropped.
+    """
+    frames = queue.Queue(maxsize=1)
+    results = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    dropped = [0]
+
+    def capture():
+        while not stop.is_set():
+            ret, frame = vid.read()
+            if not ret:
+                logging.error("Failed to grab frame")
+                stop.set()
+                break
+            if frames.full():
+                dropped[0] += 1
+                metrics.inc('lp_frames_dropped_total')
+            put_latest(frames, frame)
+
+    def inference():
+        detections = []
+        while not stop.is_set():
+            try:
+                frame = frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                result = detect_if_moving(frame, yolo_LP_detect, yolo_license_plate, tracker, gate, roi)
+                if result is not None:
+                    detections = result
+            except Exception as e:
+                logging.error(f"Error processing frame: {str(e)}")
+                continue
+            put_latest(results, (frame, detections))
+
+    workers = [
+        threading.Thread(target=capture, name='capture', daemon=True),
+        threading.Thread(target=inference, name='inference', daemon=True)
+    ]
+    for worker in workers:
+        worker.start()
+
+    prev_frame_time = 0
+    new_frame_time = 0
+    try:
+        while not stop.is_set():
+            try:
+                frame, detections = results.get(timeout=0.1)
+            except queue.Empty:
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+                continue
+
+            new_frame_time = time.time()
+            fps = int(1/(new_frame_time-prev_frame_time))
+            prev_frame_time = new_frame_time
+
+            draw_results(frame, detections, fps)
+            cv2.imshow('License Plate Detection', frame)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=2)
+        logging.info(f"Dropped {dropped[0]} stale frames")
+
+def to_record(index, timestamp, detections):
+    return {
+        'frame': index,
+        'timestamp': timestamp,
+        'plates': [
+            {'plateNumber': lp, 'bbox': {'x': x, 'y': y, 'width': w, 'height': h}}
+            for x, y, w, h, lp in detections if lp != "unknown"
+        ]
+    }
+
+def run_headless(vid, yolo_LP_detect, yolo_license_plate, tracker=None, scheduler=None, gate=None,
+                 roi=None, out=sys.stdout):
+    """Process a video without a display, writing one JSON line per frame with plates.
+
+    Frames the scheduler skips are only grabbed, not decoded, so skipping
+    also saves the decode cost. Frames the motion gate rejects are decoded
+    but not detected on, and emit nothing.
+    """
+    scheduler = scheduler or FrameScheduler()
+    index = 0
+    processed = 0
+    try:
+        while True:
+            if not scheduler.should_process(index):
+                if not vid.grab():
+                    break
+                metrics.inc('lp_frames_skipped_total')
+                index += 1
+                continue
+
+            ret, frame = vid.read()
+            if not ret:
+                break
+
+            start = time.perf_counter()
+            try:
+                detections = detect_if_moving(frame, yolo_LP_detect, yolo_license_plate, tracker, gate, roi) or []
+            except Exception as e:
+                logging.error(f"Error processing frame {index}: {str(e)}")
+                detections = []
+            scheduler.record(time.perf_counter() - start)
+            processed += 1
+
+            record = to_record(index, vid.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, detections)
+            if record['plates']:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            index += 1
+    except KeyboardInterrupt:
+        pass
+
+    logging.info(f"Processed {processed} of {index} frames (interval now {scheduler.every})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Real-time license plate recognition from a camera or video')
+    parser.add_argument('--source', default=None,
+                        help='camera index, video file or stream URL (default: first working local camera)')
+    parser.add_argument('--headless', action='store_true',
+                        help='no window; write detections to stdout as JSON lines')
+    parser.add_argument('--every', type=int, default=1,
+                        help='with --headless, run detection on every Nth frame')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='with --headless, adapt the frame interval to inference latency to stay real-time')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='run capture, inference and rendering on separate threads')
+    parser.add_argument('--no-track', action='store_true',
+                        help='run OCR on every plate in every frame instead of tracking plates')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                        help='inference backend; onnx exports and caches .onnx files next to the .pt models')
+    parser.add_argument('--roi', type=parse_polygon, default=None,
+                        help='only detect inside this polygon, as JSON pixel points: [[x, y], [x, y], ...]')
+    parser.add_argument('--motion', action='store_true',
+                        help='only run detection when the scene changes')
+    parser.add_argument('--motion-threshold', type=float, default=0.01,
+                        help='with --motion, fraction of pixels that must change to trigger detection')
+    parser.add_argument('--motion-refresh', type=int, default=30,
+                        help='with --motion, detect at least every N frames even without motion')
+    parser.add_argument('--metrics', action='store_true',
+                        help='record per-stage timings and counts and log a summary on exit')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.headless:
+        # stdout carries the JSON lines; keep log output on stderr
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+    if args.metrics:
+        metrics.enable()
+    vid = None
     try:
         # Check CUDA availability
         cuda_available = torch.cuda.is_available()
         logging.info(f"Using CUDA: {cuda_available}")
         if cuda_available:
             logging.info(f"GPU Device: {torch.cuda.get_device_name()}")
-            
+
         # Load models with explicit error handling
         model_dir = 'model'
         if not os.path.exists(model_dir):
             raise FileNotFoundError(f"Model directory not found: {model_dir}")
-            
+
         logging.info("Loading license plate detection model...")
-        yolo_LP_detect = load_model('model/LP_detector_nano_61.pt')  # Using existing model until new one is trained
-        
-        logging.info("Loading character recognition model...")
-        yolo_license_plate = load_model('model/LP_ocr_nano_62.pt')  # Using existing model until new one is trained
-
-        prev_frame_time = 0
-        new_frame_time = 0
-
-        # Try different camera indices
-        camera_indices = [1, 0]  # Try external camera first, then built-in
-        vid = None
-        for idx in camera_indices:
-            logging.info(f"Trying camera index {idx}...")
-            vid = cv2.VideoCapture(idx)
-            if vid.isOpened():
-                logging.info(f"Successfully opened camera {idx}")
-                break
-            
-        if vid is None or not vid.isOpened():
-            raise Exception("Could not open any camera")
+        yolo_LP_detect = get_model(DETECTOR_PATH, args.backend)  # Using existing model until new one is trained
 
-        while True:
-            ret, frame = vid.read()
-            if not ret:
-                logging.error("Failed to grab frame")
-                break
+        logging.info("Loading character recognition model...")
+        yolo_license_plate = get_model(RECOGNIZER_PATH, args.backend)  # Using existing model until new one is trained
 
-            try:
-                # YOLOv8 detection with confidence threshold
-                results = yolo_LP_detect(frame, conf=0.6)
-                list_plates = []
-                
-                # Process detection results
-                for r in results:
-                    boxes = r.boxes
-                    for box in boxes:
-                        # Get box coordinates and confidence
-                        b = box.xyxy[0].tolist()
-                        conf = float(box.conf)
-                        list_plates.append([b[0], b[1], b[2], b[3], conf])
-                        logging.debug(f"Detected plate with confidence: {conf:.2f}")
-                
-                # Process detected plates
-                list_read_plates = set()
-                for plate in list_plates:
-                    x = max(0, int(plate[0]))
-                    y = max(0, int(plate[1]))
-                    w = min(int(plate[2] - plate[0]), frame.shape[1] - x)
-                    h = min(int(plate[3] - plate[1]), frame.shape[0] - y)
-                    
-                    if w <= 0 or h <= 0:
-                        continue
-                        
-                    try:
-                        crop_img = frame[y:y+h, x:x+w]
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), color=(0, 0, 255), thickness=2)
-                        
-                        # Try different rotations for better recognition
-                        for cc in range(0, 2):
-                            for ct in range(0, 2):
-                                rotated_img = utils_rotate.deskew(crop_img, cc, ct)
-                                if rotated_img is None:
-                                    continue
-                                    
-                                # Use helper to read plate characters
-                                lp = helper.read_plate(yolo_license_plate, rotated_img)
-                                if lp != "unknown":
-                                    logging.debug(f"Recognized plate: {lp}")
-                                    list_read_plates.add(lp)
-                                    # Draw text with background
-                                    text_size = cv2.getTextSize(lp, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
-                                    cv2.rectangle(frame, 
-                                                (x, y-text_size[1]-10), 
-                                                (x+text_size[0], y), 
-                                                (0, 0, 0), 
-                                                -1)
-                                    cv2.putText(frame, lp, (x, y-10), 
-                                              cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36, 255, 12), 2)
-                                    break
-                            if lp != "unknown":
-                                break
-                    except Exception as e:
-                        logging.error(f"Error processing plate: {str(e)}")
-                        continue
-
-                # Calculate and display FPS
-                new_frame_time = time.time()
-                fps = int(1/(new_frame_time-prev_frame_time))
-                prev_frame_time = new_frame_time
-                
-                # Draw FPS counter with background
-                fps_text = f"FPS: {fps}"
-                cv2.rectangle(frame, (7, 30), (120, 80), (0, 0, 0), -1)
-                cv2.putText(frame, fps_text, (10, 70), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 0), 2)
-
-                # Display detected plates
-                if list_read_plates:
-                    plate_text = " | ".join(list_read_plates)
-                    bg_width = cv2.getTextSize(f"Detected: {plate_text}", 
-                                             cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0][0]
-                    cv2.rectangle(frame, 
-                                (8, frame.shape[0]-40),
-                                (bg_width+12, frame.shape[0]-10),
-                                (0, 0, 0),
-                                -1)
-                    cv2.putText(frame, f"Detected: {plate_text}", 
-                              (10, frame.shape[0]-20),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-                cv2.imshow('License Plate Detection', frame)
-                
-            except Exception as e:
-                logging.error(f"Error processing frame: {str(e)}")
-                continue
+        vid = open_source(args.source)
+        tracker = None if args.no_track else PlateTracker()
+        roi = RegionOfInterest(args.roi) if args.roi else None
+        gate = MotionGate(args.motion_threshold, refresh_every=args.motion_refresh) if args.motion else None
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        if args.headless:
+            # Streams often report no or a bogus frame rate; assume a typical camera's
+            reported_fps = vid.get(cv2.CAP_PROP_FPS)
+            source_fps = usable_fps(reported_fps)
+            if source_fps != reported_fps:
+                logging.warning(f"Source reports {reported_fps} FPS; assuming {source_fps}")
+            scheduler = FrameScheduler(args.every, args.adaptive, source_fps)
+            run_headless(vid, yolo_LP_detect, yolo_license_plate, tracker, scheduler, gate, roi)
+        elif args.pipeline:
+            run_pipelined(vid, yolo_LP_detect, yolo_license_plate, tracker, gate, roi)
+        else:
+            run_serial(vid, yolo_LP_detect, yolo_license_plate, tracker, gate, roi)
 
     except Exception as e:
         logging.error(f"Program error: {str(e)}")
         return 1
 
     finally:
-        if 'vid' in locals() and vid is not None:
+        if vid is not None:
             vid.release()
-        cv2.destroyAllWindows()
-        
+        if not args.headless:
+            cv2.destroyAllWindows()
+        if metrics.enabled:
+            metrics.registry.log_summary()
+
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())